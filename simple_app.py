@@ -4,10 +4,15 @@ Simple web interface for the Text-Based CRM Opportunity Extractor.
 """
 
 import os
+import re
 import json
+import time
+import queue
 import logging
 import datetime
-from flask import Flask, render_template_string, request, redirect, url_for, flash, session
+import threading
+from flask import (Flask, Response, abort, jsonify, render_template, render_template_string, request,
+                   redirect, url_for, flash, session)
 
 # Set up logging
 log_dir = "logs"
@@ -24,12 +29,54 @@ logging.basicConfig(
 # Import our CRM extractor modules
 import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from src.crm_extractor.extractor import CRMDataExtractor
+from src.crm_extractor.extractor import CRMDataExtractor, ExtractionTimeout
+from src.crm_extractor.admission import AdmissionController, AdmissionRejected
+from src.crm_extractor.profiling import ExtractionProfiler, client_may_request_profile, should_profile
+from src.crm_extractor.normalizer import normalize_batch
+from src.crm_extractor.router import BackendRouter
+from src.crm_extractor.result_store import ResultStore, export_csv, export_json
 
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = os.urandom(24)  # For flash messages and session
 
+# One router for all requests, so latency and coverage estimates carry over between extractions
+router = BackendRouter()
+
+# Admission control: concurrency cap, per-client rate limit and maximum document size
+admission = AdmissionController()
+# Reject oversized form posts before they are read (text may be up to 4 bytes per character)
+MAX_DOCUMENT_CONTENT_LENGTH = admission.max_document_chars * 4 + 64 * 1024
+
+# Extraction results, browsed and exported page by page on the batch results view
+store = ResultStore()
+BATCH_PAGE_SIZE = int(os.getenv("BATCH_PAGE_SIZE", "50"))
+MAX_BATCH_DOCUMENTS = int(os.getenv("MAX_BATCH_DOCUMENTS", "5000"))
+# Results normalized and stored together while a batch runs
+BATCH_NORMALIZE_SIZE = 100
+# Batch submissions hold many documents, so they get a larger request size limit
+MAX_BATCH_CONTENT_LENGTH = int(os.getenv("MAX_BATCH_CONTENT_LENGTH", str(100 * 1024 * 1024)))
+app.config['MAX_CONTENT_LENGTH'] = max(MAX_DOCUMENT_CONTENT_LENGTH, MAX_BATCH_CONTENT_LENGTH)
+
+# Batch submissions are admitted before they are read: each client may have a few batches queued
+# or running, and only so many may wait in total. A fixed set of workers (one per batch lane slot)
+# runs them with a single shared extractor.
+MAX_ACTIVE_BATCHES_PER_CLIENT = int(os.getenv("MAX_ACTIVE_BATCHES_PER_CLIENT", "2"))
+MAX_QUEUED_BATCHES = int(os.getenv("MAX_QUEUED_BATCHES", "10"))
+batch_queue = queue.Queue()
+batch_lock = threading.Lock()
+active_batches = {}  # client id -> batches queued or running
+queued_batches = 0
+batch_workers = []
+batch_extractor = None
+batch_extractor_lock = threading.Lock()
+
+@app.before_request
+def limit_content_length():
+    """Hold every request except batch submissions to the single-document size limit."""
+    if request.endpoint != 'batch' and (request.content_length or 0) > MAX_DOCUMENT_CONTENT_LENGTH:
+        abort(413)
+
 # HTML template
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -296,6 +343,23 @@ HTML_TEMPLATE = """
             </form>
         </div>
     </div>
+
+    <div class="container">
+        <h2>Batch Extraction</h2>
+        <p>Process many documents at once. Results are shown a page at a time and can be exported as JSON or CSV.</p>
+
+        <form action="{{ url_for('batch') }}" method="post" enctype="multipart/form-data">
+            <div class="form-group">
+                <label for="batch_files">Text files:</label>
+                <input type="file" id="batch_files" name="files" accept=".txt" multiple>
+            </div>
+            <div class="form-group">
+                <label for="batch_text">Or paste documents, separated by a line containing only ---:</label>
+                <textarea id="batch_text" name="batch_text" rows="8" style="width: 100%; padding: 10px; border: 1px solid #ddd; border-radius: 4px;"></textarea>
+            </div>
+            <button type="submit">Process Batch</button>
+        </form>
+    </div>
 </body>
 </html>
 """
@@ -328,7 +392,49 @@ def index():
 
 @app.route('/extract-text', methods=['POST'])
 def extract_text():
-    """Handle text input extraction."""
+    """Handle text input extraction, profiling the request when asked to."""
+    text_content = request.form.get('pdf_text', '')
+    lane = 'batch' if request.headers.get('X-Request-Lane') == 'batch' else 'interactive'
+
+    try:
+        ticket = admission.admit(request.remote_addr or 'unknown', len(text_content), lane)
+    except AdmissionRejected as e:
+        logging.warning(f"Request from {request.remote_addr} rejected ({e.status}): {e.message} {admission.stats()}")
+        return rejection_response(e)
+
+    with ticket:
+        profile_requested = (request.headers.get('X-Profile-Extraction') == '1' and
+                             client_may_request_profile(request.remote_addr))
+        if profile_requested or should_profile():
+            with ExtractionProfiler("extract_text") as profiler:
+                response = _extract_text(ticket)
+            # The response is already built; a profile that cannot be written must not turn it into a 500
+            try:
+                profile_path = profiler.save()
+                logging.info(f"Profile saved to {profile_path}: {profiler.summary()}")
+            except Exception as e:
+                logging.error(f"Error saving profile: {str(e)}", exc_info=True)
+            return response
+
+        return _extract_text(ticket)
+
+def rejection_response(error):
+    """Render the home page with an error for a request that was not admitted."""
+    response = app.make_response((
+        render_template_string(
+            HTML_TEMPLATE,
+            messages=[('error', error.message)],
+            results=None,
+            filename=None
+        ),
+        error.status
+    ))
+    if error.retry_after:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def _extract_text(ticket=None):
+    """Extract CRM data from the submitted text, holding the admission ticket while backends run."""
     logging.info("Text extraction request received")
 
     # Get the text from the form
@@ -349,8 +455,13 @@ def extract_text():
 
         # Extract CRM data
         logging.info("Extracting CRM data from text")
-        extractor = CRMDataExtractor()
-        crm_data = extractor.extract([document])
+        extractor = CRMDataExtractor(router=router)
+        latency_budget = os.getenv("EXTRACTION_LATENCY_BUDGET")
+        crm_data = extractor.extract(
+            [document],
+            latency_budget=float(latency_budget) if latency_budget else None,
+            profile=False  # Profiling, if any, is handled for the whole request above
+        )
 
         # Log the extracted data
         logging.info(f"Extracted data: {crm_data.model_dump()}")
@@ -370,14 +481,259 @@ def extract_text():
             json.dump(crm_data.model_dump(), f, indent=2)
         logging.info(f"Results saved to {results_file}")
 
+        # In speculative mode, slower backends may still produce a fuller result
+        if extractor.last_race is not None:
+            full_results_file = os.path.join(results_dir, f"text_input_{timestamp}_full_results.json")
+
+            def save_full_result(full_data):
+                if full_data is None:
+                    return
+                # The first result was normalized, so compare against the normalized full one
+                full_data = normalize_batch([full_data])[0]
+                if full_data == crm_data:
+                    return
+                with open(full_results_file, 'w') as f:
+                    json.dump(full_data.model_dump(), f, indent=2)
+                logging.info(f"Full results saved to {full_results_file}")
+
+            extractor.last_race.add_done_callback(save_full_result)
+
+            # Backends still running keep using capacity, so keep the slot until they finish
+            if ticket is not None:
+                ticket.defer()
+                extractor.last_race.add_done_callback(lambda _: ticket.release())
+
         flash('Text processed successfully!', 'success')
 
+    except ExtractionTimeout as e:
+        logging.warning(f"Extraction timed out: {str(e)}")
+        flash(f'Extraction timed out: {str(e)}', 'error')
+        # The backends are still running, so keep the slot until they finish
+        if e.race is not None and ticket is not None:
+            ticket.defer()
+            e.race.add_done_callback(lambda _: ticket.release())
+
     except Exception as e:
         logging.error(f"Error processing text: {str(e)}", exc_info=True)
         flash(f'Error processing text: {str(e)}', 'error')
 
     return redirect(url_for('index'))
 
+@app.route('/batch', methods=['POST'])
+def batch():
+    """Queue a batch of documents for extraction in the background."""
+    client_id = request.remote_addr or 'unknown'
+    if admission.batch_limit == 0:
+        flash('Batch processing is disabled: set ADMISSION_MAX_CONCURRENT to at least 2 so interactive requests keep a slot', 'error')
+        return redirect(url_for('index'))
+
+    # Admit the submission before its (possibly large) body is read
+    try:
+        reserve_batch(client_id)
+    except AdmissionRejected as e:
+        logging.warning(f"Batch from {client_id} rejected ({e.status}): {e.message}")
+        return rejection_response(e)
+
+    try:
+        documents = read_batch_documents()
+    except Exception:
+        release_batch(client_id, queued=True)
+        raise
+
+    if not documents or len(documents) > MAX_BATCH_DOCUMENTS:
+        release_batch(client_id, queued=True)
+        if documents:
+            flash(f'Too many documents: {len(documents)} (limit {MAX_BATCH_DOCUMENTS})', 'error')
+        else:
+            flash('No documents provided', 'error')
+        return redirect(url_for('index'))
+
+    batch_id = store.create_batch(len(documents))
+    logging.info(f"Batch {batch_id} queued with {len(documents)} documents")
+    batch_queue.put((batch_id, documents, client_id))
+    start_batch_workers()
+
+    return redirect(url_for('batch_results', batch_id=batch_id))
+
+def read_batch_documents():
+    """Return (filename, text) pairs from the uploaded files and the pasted text of a batch submission."""
+    documents = []
+    for uploaded in request.files.getlist('files'):
+        if uploaded.filename:
+            documents.append((uploaded.filename, uploaded.read().decode('utf-8', errors='replace')))
+
+    pasted = request.form.get('batch_text', '')
+    for index, text in enumerate(re.split(r'^\s*---\s*$', pasted, flags=re.MULTILINE), 1):
+        if text.strip():
+            documents.append((f"Pasted document {index}", text))
+    return documents
+
+def reserve_batch(client_id):
+    """Count a new batch against the client's and the queue's limits, or raise AdmissionRejected."""
+    global queued_batches
+    with batch_lock:
+        if active_batches.get(client_id, 0) >= MAX_ACTIVE_BATCHES_PER_CLIENT:
+            raise AdmissionRejected(
+                429, f"You already have {MAX_ACTIVE_BATCHES_PER_CLIENT} batches in progress, please wait for one to finish",
+                retry_after=30
+            )
+        if queued_batches >= MAX_QUEUED_BATCHES:
+            raise AdmissionRejected(503, "Too many batches are waiting, please try again later", retry_after=60)
+        active_batches[client_id] = active_batches.get(client_id, 0) + 1
+        queued_batches += 1
+
+def release_batch(client_id, queued=False):
+    """Stop counting a batch that finished (or, if queued, one that never started)."""
+    global queued_batches
+    with batch_lock:
+        if queued:
+            queued_batches -= 1
+        active_batches[client_id] -= 1
+        if not active_batches[client_id]:
+            del active_batches[client_id]
+
+def start_batch_workers():
+    """Start the batch workers on first use, one per slot of the batch admission lane."""
+    with batch_lock:
+        while len(batch_workers) < admission.batch_limit:
+            worker = threading.Thread(target=batch_worker, name=f"batch-worker-{len(batch_workers) + 1}", daemon=True)
+            worker.start()
+            batch_workers.append(worker)
+
+def batch_worker():
+    """Run queued batches one at a time."""
+    global queued_batches
+    while True:
+        batch_id, documents, client_id = batch_queue.get()
+        with batch_lock:
+            queued_batches -= 1
+        logging.info(f"Batch {batch_id} started")
+        try:
+            process_batch(batch_id, documents)
+        except Exception as e:
+            logging.error(f"Batch {batch_id} failed: {str(e)}", exc_info=True)
+        finally:
+            release_batch(client_id)
+            batch_queue.task_done()
+
+def get_batch_extractor():
+    """Return the extractor shared by the batch workers, creating it on first use."""
+    global batch_extractor
+    with batch_extractor_lock:
+        if batch_extractor is None:
+            batch_extractor = CRMDataExtractor(router=router)
+        return batch_extractor
+
+def process_batch(batch_id, documents):
+    """Extract each document of a batch in the batch admission lane and store the results."""
+    from langchain_core.documents import Document
+
+    # Results are normalized together, a few documents at a time, before they are stored
+    pending = []
+    last_flush = time.monotonic()
+
+    def flush():
+        results = normalize_batch([result for _, result, _ in pending])
+        for (filename, _, error), result in zip(pending, results):
+            store.add(result.model_dump() if result is not None else None, filename, batch_id, error=error)
+        pending.clear()
+
+    for filename, text in documents:
+        while True:
+            try:
+                # The batch was admitted on submission, so its documents are only throttled by
+                # the batch lane's share of the slots, not by the submitter's rate limit
+                ticket = admission.admit('batch', len(text), 'batch', rate_limited=False)
+                break
+            except AdmissionRejected as e:
+                if e.status != 503:
+                    ticket = None
+                    pending.append((filename, None, e.message))
+                    break
+                # Every batch slot is taken: wait for one to free up
+                time.sleep(1)
+
+        if ticket is not None:
+            with ticket:
+                try:
+                    # Created inside a slot, so loading a local model counts against capacity
+                    extractor = get_batch_extractor()
+                    document = [Document(page_content=text)]
+                    if extractor.speculative:
+                        # Hold the slot until the slower backends finish too, and keep their fuller result
+                        crm_data, race = extractor.extract_speculative(document, normalize=False)
+                        crm_data = race.full() or crm_data
+                    else:
+                        crm_data = extractor.extract(document, profile=False, normalize=False)
+                    pending.append((filename, crm_data, None))
+                except Exception as e:
+                    logging.error(f"Error processing {filename} in batch {batch_id}: {str(e)}")
+                    pending.append((filename, None, str(e)))
+
+        if len(pending) >= BATCH_NORMALIZE_SIZE or time.monotonic() - last_flush >= 5:
+            flush()
+            last_flush = time.monotonic()
+
+    flush()
+    logging.info(f"Batch {batch_id} finished")
+
+@app.route('/batch/<batch_id>')
+def batch_results(batch_id):
+    """Render one page of a batch's results; details are fetched per result when expanded."""
+    batch_info = store.get_batch(batch_id)
+    if batch_info is None:
+        abort(404)
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    results, total = store.page(batch_id, page, BATCH_PAGE_SIZE)
+    pages = max((total + BATCH_PAGE_SIZE - 1) // BATCH_PAGE_SIZE, 1)
+
+    return render_template(
+        'batch_results.html',
+        batch=batch_info,
+        results=results,
+        page=page,
+        pages=pages,
+        per_page=BATCH_PAGE_SIZE
+    )
+
+@app.route('/batch/<batch_id>/export.<fmt>')
+def export_batch(batch_id, fmt):
+    """Stream all results of a batch as a JSON or CSV download."""
+    if fmt not in ('json', 'csv') or store.get_batch(batch_id) is None:
+        abort(404)
+
+    results = store.iter_batch(batch_id)
+    body = export_json(results) if fmt == 'json' else export_csv(results)
+    return Response(
+        body,
+        mimetype='application/json' if fmt == 'json' else 'text/csv',
+        headers={'Content-Disposition': f'attachment; filename=batch_{batch_id}_crm_data.{fmt}'}
+    )
+
+# Results are only reachable through their batch's unguessable id
+@app.route('/batch/<batch_id>/results/<int:result_id>')
+def result_detail(batch_id, result_id):
+    """Return one result of a batch as JSON."""
+    result = store.get(result_id, batch_id)
+    if result is None:
+        abort(404)
+    return jsonify(result)
+
+@app.route('/batch/<batch_id>/results/<int:result_id>/export.<fmt>')
+def export_result(batch_id, result_id, fmt):
+    """Download one result of a batch as JSON or CSV."""
+    result = store.get(result_id, batch_id)
+    if fmt not in ('json', 'csv') or result is None:
+        abort(404)
+
+    body = export_json([result]) if fmt == 'json' else export_csv([result])
+    return Response(
+        body,
+        mimetype='application/json' if fmt == 'json' else 'text/csv',
+        headers={'Content-Disposition': f'attachment; filename=result_{result_id}_crm_data.{fmt}'}
+    )
+
 if __name__ == '__main__':
     print("Starting Text-Based CRM Opportunity Extractor web interface...")
     print("Open your browser and go to http://127.0.0.1:5000/")
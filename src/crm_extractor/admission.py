@@ -0,0 +1,297 @@
+"""
+Admission Control Module
+
+This module decides whether an extraction request may run now. It enforces a
+maximum document size, a per-client token bucket, and a global concurrency cap
+sized to the backend's capacity, with separate lanes so batch work cannot crowd
+out interactive requests. Requests that cannot be admitted are rejected at once
+(or after a short bounded wait for interactive requests) instead of queuing
+until they time out.
+"""
+
+import os
+import math
+import time
+import threading
+from typing import Optional
+
+from .extractor import DEFAULT_MODEL_PATH, OPENAI_KEY_PLACEHOLDER
+
+# Priority lanes; interactive requests may use every slot, batch requests only a share
+LANES = ("interactive", "batch")
+
+# Characters of document text that cost one extra token
+CHARS_PER_TOKEN = 10000
+
+
+def default_concurrency() -> int:
+    """
+    Estimate how many extractions the configured backend can run at once.
+
+    An in-process local model handles one document at a time and holds most of the
+    machine's memory, a model server serializes inference on its side, remote APIs
+    tolerate a few parallel calls, and the rule engine is bounded by CPU cores.
+    """
+    if os.getenv("MODEL_SERVER_ADDRESS"):
+        return 2
+    model_path = os.getenv("LOCAL_MODEL_PATH", DEFAULT_MODEL_PATH)
+    if os.path.exists(model_path):
+        return 1
+    if os.getenv("OPENAI_API_KEY", OPENAI_KEY_PLACEHOLDER) != OPENAI_KEY_PLACEHOLDER:
+        return 4
+    return os.cpu_count() or 2
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted."""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a fixed rate."""
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Initialize a full bucket.
+
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum number of tokens
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost: float) -> float:
+        """
+        Take tokens from the bucket if enough are available.
+
+        Args:
+            cost: Number of tokens to take
+
+        Returns:
+            0 if the tokens were taken, otherwise the seconds until enough will be available
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        if cost > self.capacity:
+            return math.inf
+        return (cost - self.tokens) / self.rate
+
+    def refund(self, cost: float):
+        """Return tokens taken for a request that was not run."""
+        self.tokens = min(self.capacity, self.tokens + cost)
+
+
+class AdmissionTicket:
+    """Slot held by an admitted request; release it by leaving the `with` block."""
+
+    def __init__(self, controller: "AdmissionController", lane: str):
+        self.controller = controller
+        self.lane = lane
+        self.released = False
+        self.deferred = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.deferred:
+            self.release()
+        return False
+
+    def defer(self):
+        """
+        Keep the slot after the `with` block, for work that continues in the background
+        (e.g. speculative backends still running). The caller must call release() later.
+        """
+        self.deferred = True
+
+    def release(self):
+        """Free the slot (safe to call more than once)."""
+        if not self.released:
+            self.released = True
+            self.controller._release(self.lane)
+
+
+class AdmissionController:
+    """Admission control for extraction requests."""
+
+    def __init__(self, max_concurrent: Optional[int] = None, batch_share: Optional[float] = None,
+                 queue_timeout: Optional[float] = None, rate_per_minute: Optional[float] = None,
+                 burst: Optional[float] = None, max_document_chars: Optional[int] = None):
+        """
+        Initialize the controller. Unset arguments are read from the environment.
+
+        Args:
+            max_concurrent: Extractions running at once (ADMISSION_MAX_CONCURRENT, default from backend capacity)
+            batch_share: Fraction of slots batch requests may use (ADMISSION_BATCH_SHARE, default 0.5)
+            queue_timeout: Seconds an interactive request may wait for a slot (ADMISSION_QUEUE_TIMEOUT, default 2)
+            rate_per_minute: Tokens each client earns per minute (ADMISSION_RATE_PER_MINUTE, default 30)
+            burst: Token bucket capacity per client (ADMISSION_BURST, default 10)
+            max_document_chars: Largest accepted document (MAX_DOCUMENT_CHARS, default 50000)
+        """
+        if max_concurrent is None:
+            max_concurrent = int(os.getenv("ADMISSION_MAX_CONCURRENT", "0")) or default_concurrency()
+        if batch_share is None:
+            batch_share = float(os.getenv("ADMISSION_BATCH_SHARE", "0.5"))
+        if queue_timeout is None:
+            queue_timeout = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))
+        if rate_per_minute is None:
+            rate_per_minute = float(os.getenv("ADMISSION_RATE_PER_MINUTE", "30"))
+        if burst is None:
+            burst = float(os.getenv("ADMISSION_BURST", "10"))
+        if max_document_chars is None:
+            max_document_chars = int(os.getenv("MAX_DOCUMENT_CHARS", "50000"))
+
+        self.max_concurrent = max(1, max_concurrent)
+        # At least one slot is always left to interactive requests, so with a single
+        # slot batch requests are not admitted at all
+        self.batch_limit = max(0, min(int(self.max_concurrent * batch_share) or 1, self.max_concurrent - 1))
+        self.queue_timeout = queue_timeout
+        self.max_waiting = self.max_concurrent * 2
+        self.rate = rate_per_minute / 60
+        self.max_document_chars = max_document_chars
+        # The bucket must hold the cost of the largest accepted document, or that document
+        # could never be admitted no matter how long the client waited
+        self.burst = max(burst, self.token_cost(max_document_chars))
+
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+        self._active = {lane: 0 for lane in LANES}
+        self._waiting = 0
+        self._slots = threading.Condition()
+
+    def admit(self, client_id: str, document_chars: int, lane: str = "interactive",
+              rate_limited: bool = True) -> AdmissionTicket:
+        """
+        Admit a request or reject it.
+
+        Args:
+            client_id: Identifier of the client (e.g. its IP address)
+            document_chars: Size of the submitted document in characters
+            lane: "interactive" or "batch"
+            rate_limited: Charge the client's token bucket; pass False for work that was
+                admitted as a whole already (e.g. the documents of a queued batch)
+
+        Returns:
+            AdmissionTicket that must be released when the request finishes
+
+        Raises:
+            AdmissionRejected: With status 413 (document too large), 429 (client over its
+                rate limit) or 503 (no capacity)
+        """
+        if lane not in LANES:
+            lane = "interactive"
+
+        if lane == "batch" and self.batch_limit == 0:
+            raise AdmissionRejected(
+                503, "Batch processing needs ADMISSION_MAX_CONCURRENT of at least 2 to keep a slot for interactive requests"
+            )
+
+        if document_chars > self.max_document_chars:
+            raise AdmissionRejected(
+                413, f"Document too large: {document_chars} characters (limit {self.max_document_chars})"
+            )
+
+        cost = self.token_cost(document_chars) if rate_limited else 0
+        if cost > self.burst:
+            raise AdmissionRejected(
+                413, f"Document too large: {document_chars} characters exceed the rate limit burst of {self.burst:g} tokens"
+            )
+
+        wait = self._take_tokens(client_id, cost) if cost else 0
+        if wait:
+            raise AdmissionRejected(429, "Too many requests, please slow down", max(1, math.ceil(wait)))
+
+        if not self._acquire(lane):
+            if cost:
+                self._refund_tokens(client_id, cost)
+            raise AdmissionRejected(503, "The extractor is busy, please try again shortly", retry_after=5)
+
+        return AdmissionTicket(self, lane)
+
+    @staticmethod
+    def token_cost(document_chars: int) -> int:
+        """Return the rate limit tokens charged for a document of the given size."""
+        return 1 + document_chars // CHARS_PER_TOKEN
+
+    def stats(self) -> dict:
+        """Return current slot usage."""
+        with self._slots:
+            return {
+                "active": dict(self._active),
+                "waiting": self._waiting,
+                "max_concurrent": self.max_concurrent,
+                "batch_limit": self.batch_limit,
+            }
+
+    def _take_tokens(self, client_id: str, cost: float) -> float:
+        """Charge a client's bucket, returning 0 or the seconds to wait."""
+        with self._buckets_lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is None:
+                if len(self._buckets) > 10000:
+                    self._prune_buckets()
+                bucket = self._buckets[client_id] = TokenBucket(self.rate, self.burst)
+            return bucket.take(cost)
+
+    def _refund_tokens(self, client_id: str, cost: float):
+        """Give back tokens for a request that was rejected for capacity."""
+        with self._buckets_lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is not None:
+                bucket.refund(cost)
+
+    def _prune_buckets(self):
+        """Drop buckets of clients that have been idle long enough to be full again."""
+        now = time.monotonic()
+        refill_time = self.burst / self.rate if self.rate else math.inf
+        for client_id in [cid for cid, bucket in self._buckets.items() if now - bucket.updated > refill_time]:
+            del self._buckets[client_id]
+
+    def _has_slot(self, lane: str) -> bool:
+        """Check whether a request in the given lane can start now."""
+        if sum(self._active.values()) >= self.max_concurrent:
+            return False
+        return lane != "batch" or self._active["batch"] < self.batch_limit
+
+    def _acquire(self, lane: str) -> bool:
+        """Take a slot, waiting briefly for interactive requests only."""
+        with self._slots:
+            if self._has_slot(lane):
+                self._active[lane] += 1
+                return True
+
+            if lane == "batch" or self.queue_timeout <= 0 or self._waiting >= self.max_waiting:
+                return False
+
+            deadline = time.monotonic() + self.queue_timeout
+            self._waiting += 1
+            try:
+                while not self._has_slot(lane):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._slots.wait(remaining)
+                self._active[lane] += 1
+                return True
+            finally:
+                self._waiting -= 1
+
+    def _release(self, lane: str):
+        """Free a slot and wake waiting requests."""
+        with self._slots:
+            self._active[lane] -= 1
+            self._slots.notify_all()
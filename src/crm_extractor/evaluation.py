@@ -0,0 +1,346 @@
+"""
+Evaluation Module
+
+This module scores extraction configurations against a labelled corpus so faster
+configurations (smaller quantization, shorter context, rules only) can be compared
+with slower ones on accuracy, latency, token usage and memory.
+
+The corpus is a JSONL file where each line holds an "id", the document "text" and
+the "expected" field values. Each configuration runs in its own worker process, so
+configurations are evaluated in parallel and their memory use is measured separately.
+
+Run an evaluation with:
+    python -m src.crm_extractor.evaluation --corpus evaluation/corpus.jsonl
+"""
+
+import os
+import re
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from langchain_core.documents import Document
+
+from .extractor import CRMDataExtractor, EXTRACTION_PROMPT
+from .normalizer import normalize_date, normalize_phone
+
+# Configurations evaluated when no configuration file is given
+DEFAULT_CONFIGURATIONS = [
+    {"name": "rules-only", "backends": ["rules"]},
+    {"name": "routed", "backends": ["rules", "local", "openai"]},
+    {"name": "local-short-context", "backends": ["rules", "local"],
+     "model_config": {"context_length": 1024, "max_new_tokens": 512}},
+    {"name": "speculative", "backends": ["rules", "local", "openai"], "speculative": True},
+]
+
+
+def load_corpus(path: str) -> List[dict]:
+    """
+    Load a labelled corpus.
+
+    Args:
+        path: JSONL file with "id", "text" and "expected" keys on each line
+
+    Returns:
+        List of corpus entries
+    """
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            entry.setdefault("id", str(line_number))
+            entries.append(entry)
+    return entries
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of LLM tokens in a text (about 4 characters per token)."""
+    return len(text) // 4
+
+
+def _canonical(field: str, value):
+    """Reduce a field value to a form where equivalent values compare equal."""
+    if value is None or value == "" or value == []:
+        return None
+    if isinstance(value, list):
+        return frozenset(_canonical(field, item) for item in value if item not in (None, ""))
+    if isinstance(value, (int, float)):
+        return round(float(value), 2)
+
+    text = re.sub(r"\s+", " ", str(value)).strip().casefold()
+    if field == "contact_phone":
+        return normalize_phone(str(value)) or text
+    if field == "timeline":
+        return normalize_date(str(value)) or text
+    return text
+
+
+def score_fields(expected: dict, predicted: dict) -> Dict[str, Dict[str, int]]:
+    """
+    Count true positives, false positives and false negatives per labelled field.
+
+    Args:
+        expected: Ground-truth field values (None means the field should be empty)
+        predicted: Extracted field values
+
+    Returns:
+        Mapping of field name to {"tp", "fp", "fn"} counts
+    """
+    counts = {}
+    for field, expected_value in expected.items():
+        truth = _canonical(field, expected_value)
+        guess = _canonical(field, predicted.get(field))
+
+        tp = int(truth is not None and guess == truth)
+        fp = int(guess is not None and guess != truth)
+        fn = int(truth is not None and guess != truth)
+        counts[field] = {"tp": tp, "fp": fp, "fn": fn}
+    return counts
+
+
+def _precision_recall(tp: int, fp: int, fn: int) -> Dict[str, Optional[float]]:
+    """Compute precision, recall and F1 from counts."""
+    precision = tp / (tp + fp) if tp + fp else None
+    recall = tp / (tp + fn) if tp + fn else None
+    if precision and recall:
+        f1 = 2 * precision * recall / (precision + recall)
+    else:
+        f1 = 0.0 if precision is not None or recall is not None else None
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    """Return the value at the given fraction of a sorted list (nearest rank)."""
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Return this process's peak resident memory in megabytes."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def evaluate_configuration(config: dict, corpus: List[dict]) -> dict:
+    """
+    Run one configuration over a corpus and score it.
+
+    Args:
+        config: Configuration with a "name" and optional "backends", "speculative",
+            "min_coverage", "latency_budget", "model_path" and "model_config" keys
+        corpus: Corpus entries from load_corpus
+
+    Returns:
+        Report with per-field and overall precision/recall, latency, tokens and memory
+    """
+    rss_before = _peak_rss_mb()
+    extractor = CRMDataExtractor(
+        speculative=config.get("speculative", False),
+        model_path=config.get("model_path"),
+        model_config=config.get("model_config")
+    )
+
+    requested = config.get("backends")
+    if requested:
+        missing = [name for name in requested if name not in extractor.backends]
+        if missing:
+            print(f"[{config['name']}] Backends not available: {', '.join(missing)}")
+        extractor.backends = {name: backend for name, backend in extractor.backends.items() if name in requested}
+
+    # Keep evaluation runs out of the production routing log
+    extractor.router.log_path = ""
+    if config.get("min_coverage") is not None:
+        extractor.router.min_coverage = config["min_coverage"]
+
+    field_counts = {}
+    latencies = []
+    prompt_tokens = 0
+    errors = 0
+    documents = []
+
+    for entry in corpus:
+        start = time.perf_counter()
+        try:
+            result = extractor.extract([Document(page_content=entry["text"])],
+                                       latency_budget=config.get("latency_budget"))
+            predicted = result.model_dump()
+        except Exception as e:
+            print(f"[{config['name']}] Error on {entry['id']}: {str(e)}")
+            predicted = {}
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+
+        # Let speculative runs finish so they do not overlap the next document
+        if extractor.last_race is not None:
+            extractor.last_race.full()
+            attempts = extractor.last_race.attempts
+        elif extractor.router.decisions:
+            attempts = extractor.router.decisions[-1].attempts
+        else:
+            attempts = []
+        llm_calls = sum(1 for attempt in attempts if attempt.backend != "rules")
+        prompt_tokens += llm_calls * estimate_tokens(EXTRACTION_PROMPT + entry["text"])
+
+        counts = score_fields(entry["expected"], predicted)
+        for field, field_count in counts.items():
+            totals = field_counts.setdefault(field, {"tp": 0, "fp": 0, "fn": 0})
+            for key in totals:
+                totals[key] += field_count[key]
+        documents.append({"id": entry["id"], "latency": latencies[-1], "fields": counts})
+
+    overall = {key: sum(counts[key] for counts in field_counts.values()) for key in ("tp", "fp", "fn")}
+    peak_rss = _peak_rss_mb()
+
+    return {
+        "name": config["name"],
+        "config": config,
+        "backends": list(extractor.backends),
+        "documents": len(corpus),
+        "errors": errors,
+        "overall": _precision_recall(**overall),
+        "fields": {field: {**counts, **_precision_recall(**counts)} for field, counts in field_counts.items()},
+        "latency": {
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "p50": _percentile(latencies, 0.5) if latencies else None,
+            "p95": _percentile(latencies, 0.95) if latencies else None,
+            "max": max(latencies) if latencies else None,
+        },
+        "estimated_prompt_tokens": prompt_tokens,
+        "memory": {
+            "peak_rss_mb": peak_rss,
+            "model_rss_mb": peak_rss - rss_before if peak_rss is not None and rss_before is not None else None,
+        },
+        "per_document": documents,
+    }
+
+
+def pareto_front(reports: List[dict]) -> List[str]:
+    """
+    Find the configurations no other configuration beats on every objective.
+
+    Objectives are higher overall F1, lower p95 latency and lower peak memory.
+
+    Args:
+        reports: Reports from evaluate_configuration
+
+    Returns:
+        Names of the Pareto-optimal configurations
+    """
+    def objectives(report):
+        return (
+            -(report["overall"]["f1"] or 0.0),
+            report["latency"]["p95"] or 0.0,
+            report["memory"]["peak_rss_mb"] or 0.0,
+        )
+
+    front = []
+    for report in reports:
+        own = objectives(report)
+        dominated = False
+        for other in reports:
+            theirs = objectives(other)
+            if other is not report and all(t <= o for t, o in zip(theirs, own)) and theirs != own:
+                dominated = True
+                break
+        if not dominated:
+            front.append(report["name"])
+    return front
+
+
+def _evaluate_in_fresh_process(config: dict, corpus: List[dict]) -> dict:
+    """
+    Run evaluate_configuration in a newly spawned process.
+
+    Peak RSS is a lifetime maximum, so a process must never be reused for another
+    configuration or its memory figures would include the previous model.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(evaluate_configuration, config, corpus).result()
+
+
+def run_evaluation(corpus: List[dict], configurations: List[dict], workers: int = 2) -> dict:
+    """
+    Evaluate several configurations in parallel, each in its own process.
+
+    Args:
+        corpus: Corpus entries from load_corpus
+        configurations: Configurations to evaluate
+        workers: Number of configurations evaluated at the same time
+
+    Returns:
+        Dictionary with a report per configuration and the Pareto-optimal configuration names
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(_evaluate_in_fresh_process, config, corpus) for config in configurations]
+        reports = [future.result() for future in futures]
+
+    return {"configurations": reports, "pareto_optimal": pareto_front(reports)}
+
+
+def format_report(evaluation: dict) -> str:
+    """Format an evaluation as a plain-text table."""
+    def fmt(value, pattern="{:.2f}"):
+        return pattern.format(value) if value is not None else "-"
+
+    lines = [
+        f"{'configuration':<24} {'precision':>9} {'recall':>7} {'f1':>5} {'p95 s':>7} {'tokens':>7} {'rss MB':>7}",
+    ]
+    for report in evaluation["configurations"]:
+        marker = " *" if report["name"] in evaluation["pareto_optimal"] else ""
+        lines.append(
+            f"{report['name']:<24} {fmt(report['overall']['precision']):>9} {fmt(report['overall']['recall']):>7} "
+            f"{fmt(report['overall']['f1']):>5} {fmt(report['latency']['p95'], '{:.3f}'):>7} "
+            f"{report['estimated_prompt_tokens']:>7} {fmt(report['memory']['peak_rss_mb'], '{:.0f}'):>7}{marker}"
+        )
+    lines.append("* Pareto-optimal (F1 vs p95 latency vs memory)")
+
+    for report in evaluation["configurations"]:
+        lines.append("")
+        lines.append(f"{report['name']} per-field precision/recall:")
+        for field, stats in sorted(report["fields"].items()):
+            lines.append(f"  {field:<26} P={fmt(stats['precision'])} R={fmt(stats['recall'])}")
+    return "\n".join(lines)
+
+
+def main():
+    """Command-line entry point for the evaluation runner."""
+    parser = argparse.ArgumentParser(description="Score extraction configurations against a labelled corpus.")
+    parser.add_argument("--corpus", default=os.path.join("evaluation", "corpus.jsonl"),
+                        help="JSONL corpus of text and expected fields")
+    parser.add_argument("--configs", default=None,
+                        help="JSON file with a list of configurations (defaults to the built-in set)")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="Configurations to evaluate in parallel (more workers skew latency)")
+    parser.add_argument("--output", default=None, help="Write the full report to this JSON file")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if args.configs:
+        with open(args.configs, encoding="utf-8") as f:
+            configurations = json.load(f)
+    else:
+        configurations = DEFAULT_CONFIGURATIONS
+
+    evaluation = run_evaluation(corpus, configurations, workers=args.workers)
+    print(format_report(evaluation))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(evaluation, f, indent=2, ensure_ascii=False)
+        print(f"Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,8 @@ This module extracts structured CRM opportunity data from document text using AI
 
 import os
 import sys
-from typing import List, Optional
+from functools import partial
+from typing import List, Optional, Tuple
 from pydantic import BaseModel, Field
 from langchain_core.documents import Document
 from langchain.chains import LLMChain
@@ -15,13 +16,74 @@ from langchain_openai import ChatOpenAI
 from langchain_community.llms import CTransformers
 from dotenv import load_dotenv
 
+from .normalizer import normalize_batch, parse_amount, parse_probability
+from .regex_guard import RuleBudget
+from .profiling import ExtractionProfiler, current_profiler, phase, should_profile
+from .model_server import ModelServerClient
+from .router import BackendAttempt, BackendRouter
+from .speculative import SpeculativeRace
+
 # Load environment variables
 load_dotenv()
 
 # Add the project root to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
+# Default location of the local GGUF model
+DEFAULT_MODEL_PATH = os.path.join("models", "mistral-7b-instruct-v0.2.Q4_K_M.gguf")
+
+# Value of OPENAI_API_KEY in the example .env file, treated as no key
+OPENAI_KEY_PLACEHOLDER = "your_openai_api_key_here"
+
+# Generation settings for the local model
+LOCAL_MODEL_CONFIG = {
+    'max_new_tokens': 1024,
+    'temperature': 0.1,
+    'context_length': 2048,
+}
+
+# Prompt used by every LLM backend, including the standalone model server
+EXTRACTION_PROMPT = """
+            You are an AI assistant specialized in extracting CRM opportunity data from documents.
+
+            Please analyze the following document text and extract structured information about potential sales opportunities.
+
+            Document text:
+            {document_text}
+
+            Extract the following information in JSON format:
+            - company_name: The name of the company mentioned
+            - contact_name: The name of the primary contact person
+            - contact_email: Email address of the contact
+            - contact_phone: Phone number of the contact
+            - opportunity_value: The monetary value of the opportunity (just the number)
+            - currency: The currency of the opportunity value
+            - timeline: Expected timeline or deadline for the opportunity
+            - product_interest: List of products or services the company is interested in
+            - opportunity_stage: Current stage in the sales process
+            - probability: Probability of closing the deal (0-100%)
+            - notes: Any additional relevant information
+
+            If any field is not found in the document, set it to null.
+            Return ONLY the JSON object, nothing else.
+            """
+
 # Define CRM Opportunity data model
+class ExtractionTimeout(Exception):
+    """Raised when the latency budget runs out before any backend produced a result."""
+
+    def __init__(self, message: str, race: Optional[SpeculativeRace] = None):
+        """
+        Initialize the error.
+
+        Args:
+            message: Description of the timeout
+            race: Speculative race whose backends are still running, if any
+        """
+        super().__init__(message)
+        self.race = race
+
+
 class CRMOpportunity(BaseModel):
     """Data model for CRM opportunity information."""
 
@@ -46,412 +108,640 @@ class CRMOpportunity(BaseModel):
     integration_requirements: Optional[List[str]] = Field(None, description="Integration requirements")
     other_requirements: Optional[List[str]] = Field(None, description="Other client requirements")
 
+    # Normalized fields derived from the values above
+    contact_phone_e164: Optional[str] = Field(None, description="Contact phone number in E.164 format, if its country is certain")
+    timeline_iso: Optional[str] = Field(None, description="Timeline as an ISO date (YYYY-MM-DD), month (YYYY-MM) or quarter (YYYY-Qn)")
+    voivodeship: Optional[str] = Field(None, description="Polish voivodeship parsed from the location")
+    postal_code: Optional[str] = Field(None, description="Postal code parsed from the location")
+    city: Optional[str] = Field(None, description="City parsed from the location")
+
 class CRMDataExtractor:
     """Class for extracting CRM data from documents using AI."""
 
-    def __init__(self):
+    def __init__(self, speculative: Optional[bool] = None, model_path: Optional[str] = None,
+                 model_config: Optional[dict] = None, router: Optional[BackendRouter] = None):
         """
         Initialize the CRM data extractor.
+
+        Args:
+            speculative: Run all backends concurrently and return the first complete
+                enough result (defaults to the SPECULATIVE_EXTRACTION environment variable)
+            model_path: Path to the local GGUF model (defaults to LOCAL_MODEL_PATH)
+            model_config: Overrides for the local model's generation settings
+            router: BackendRouter to use, so latency estimates and decisions can be shared
+                across extractors (a new router is created if not given)
         """
+        if speculative is None:
+            speculative = os.getenv("SPECULATIVE_EXTRACTION", "").lower() in ("1", "true", "yes")
+        self.speculative = speculative
+        self.last_race = None
+        self.last_profile_path = None
+
+        self.llm = None
+        self.local_llm = None
+        self.openai_llm = None
+
+        self.model_server = None
+
+        # Prefer a running model server, which keeps the local model warm across restarts
+        # (unless a specific model or model configuration was requested)
+        server_address = os.getenv("MODEL_SERVER_ADDRESS")
+        if server_address and not (model_path or model_config):
+            client = ModelServerClient(server_address)
+            if client.ping():
+                print(f"Using model server at: {server_address}")
+                self.model_server = client
+            else:
+                print(f"Model server at {server_address} is not responding, loading the model in-process.")
+
         # Check for local model first
-        model_path = os.path.join("models", "mistral-7b-instruct-v0.2.Q4_K_M.gguf")
-        local_model_path = os.getenv("LOCAL_MODEL_PATH", model_path)
+        local_model_path = model_path or os.getenv("LOCAL_MODEL_PATH", DEFAULT_MODEL_PATH)
 
-        print(f"Looking for model at: {os.path.abspath(local_model_path)}")
+        if not self.model_server:
+            print(f"Looking for model at: {os.path.abspath(local_model_path)}")
 
         # Try to use local LLM if available
-        if os.path.exists(local_model_path):
+        if not self.model_server and os.path.exists(local_model_path):
             try:
                 print(f"Using local LLM: {local_model_path}")
                 # Get absolute path to model
                 abs_model_path = os.path.abspath(local_model_path)
                 print(f"Absolute model path: {abs_model_path}")
 
-                self.llm = CTransformers(
+                self.local_llm = CTransformers(
                     model=abs_model_path,
                     model_type="mistral",
-                    config={
-                        'max_new_tokens': 1024,
-                        'temperature': 0.1,
-                        'context_length': 2048,
-                    }
+                    config={**LOCAL_MODEL_CONFIG, **(model_config or {})}
                 )
                 print("Successfully loaded the model!")
             except Exception as e:
                 print(f"Error loading local model: {str(e)}")
-                print("Falling back to dummy extractor.")
-                self.llm = None
-        # Fallback to OpenAI if local model not available and API key exists
-        elif os.getenv("OPENAI_API_KEY"):
+                self.local_llm = None
+
+        # OpenAI is used when no local model is available, or alongside it only when remote
+        # escalation is explicitly enabled, so document text stays on this machine by default
+        openai_key = os.getenv("OPENAI_API_KEY", "")
+        has_local = bool(self.model_server or self.local_llm)
+        allow_remote = os.getenv("ROUTER_ALLOW_REMOTE", "").lower() in ("1", "true", "yes")
+        if openai_key and openai_key != OPENAI_KEY_PLACEHOLDER and (allow_remote or not has_local):
             try:
-                self.llm = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=0)
+                self.openai_llm = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=0)
                 print(f"Using OpenAI model: gpt-3.5-turbo")
             except Exception as e:
                 print(f"Error initializing OpenAI: {str(e)}")
-                print("Falling back to dummy extractor.")
-                self.llm = None
-        else:
-            print("No local model or API key found. Using dummy extractor.")
-            self.llm = None
+                self.openai_llm = None
+
+        self.llm = self.local_llm or self.openai_llm
+        if not self.llm and not self.model_server:
+            print("No local model or API key found. Using rule-based extractor.")
 
         # Create the prompt template for CRM data extraction
         self.prompt_template = PromptTemplate(
             input_variables=["document_text"],
-            template="""
-            You are an AI assistant specialized in extracting CRM opportunity data from documents.
-
-            Please analyze the following document text and extract structured information about potential sales opportunities.
-
-            Document text:
-            {document_text}
-
-            Extract the following information in JSON format:
-            - company_name: The name of the company mentioned
-            - contact_name: The name of the primary contact person
-            - contact_email: Email address of the contact
-            - contact_phone: Phone number of the contact
-            - opportunity_value: The monetary value of the opportunity (just the number)
-            - currency: The currency of the opportunity value
-            - timeline: Expected timeline or deadline for the opportunity
-            - product_interest: List of products or services the company is interested in
-            - opportunity_stage: Current stage in the sales process
-            - probability: Probability of closing the deal (0-100%)
-            - notes: Any additional relevant information
-
-            If any field is not found in the document, set it to null.
-            Return ONLY the JSON object, nothing else.
-            """
+            template=EXTRACTION_PROMPT
         )
 
-        # Create the LLM chain
+        # Create the LLM chains
+        self.local_chain = LLMChain(llm=self.local_llm, prompt=self.prompt_template) if self.local_llm else None
+        self.openai_chain = LLMChain(llm=self.openai_llm, prompt=self.prompt_template) if self.openai_llm else None
         if self.llm:
-            self.chain = LLMChain(llm=self.llm, prompt=self.prompt_template)
+            self.chain = self.local_chain or self.openai_chain
+
+        # Backends in order of increasing cost; the router picks among them per document
+        self.backends = {"rules": self._extract_with_rules}
+        if self.model_server:
+            self.backends["local"] = self._extract_with_server
+        elif self.local_chain:
+            self.backends["local"] = partial(self._extract_with_chain, self.local_chain)
+        if self.openai_chain:
+            self.backends["openai"] = partial(self._extract_with_chain, self.openai_chain)
 
-    def extract(self, documents: List[Document]) -> CRMOpportunity:
+        self.router = router or BackendRouter()
+
+    def extract(self, documents: List[Document], latency_budget: Optional[float] = None,
+                profile: Optional[bool] = None, normalize: bool = True) -> CRMOpportunity:
         """
         Extract CRM opportunity data from documents.
 
+        The document is routed to the cheapest backend likely to fill the schema and
+        escalated to heavier backends while field coverage stays too low. In speculative
+        mode all backends run concurrently instead (see `extract_speculative`).
+
         Args:
             documents: List of Document objects containing text
+            latency_budget: Maximum time in seconds to spend on extraction (None for no limit)
+            profile: Write a speedscope profile of this extraction (defaults to the
+                PROFILE_EXTRACTION / PROFILE_SAMPLE_RATE environment variables)
+            normalize: Normalize the result; pass False when the caller normalizes
+                many results together with `normalize_batch`
 
         Returns:
             CRMOpportunity object with extracted data
+
+        Raises:
+            ExtractionTimeout: If the latency budget ran out before any backend produced a result
         """
+        self.last_profile_path = None
+        if profile is None:
+            profile = should_profile()
+
+        # Already inside a profiled request (e.g. the web route): just add to that profile
+        if not profile or current_profiler() is not None:
+            return self._extract(documents, latency_budget, normalize)
+
+        with ExtractionProfiler("extract") as profiler:
+            try:
+                return self._extract(documents, latency_budget, normalize)
+            finally:
+                # A profile that cannot be written must not replace the extraction result or error
+                try:
+                    self.last_profile_path = profiler.save()
+                    print(f"Profile saved to {self.last_profile_path}: {profiler.summary()}")
+                except Exception as e:
+                    print(f"Error saving profile: {str(e)}")
+
+    def _extract(self, documents: List[Document], latency_budget: Optional[float],
+                 normalize: bool = True) -> CRMOpportunity:
+        """Run the extraction in routed or speculative mode."""
+        self.last_race = None
+        if self.speculative:
+            try:
+                result, self.last_race = self.extract_speculative(documents, latency_budget=latency_budget,
+                                                                  normalize=normalize)
+            except ExtractionTimeout as e:
+                # The backends keep running; callers may still wait for them through last_race
+                self.last_race = e.race
+                raise
+            return result
+
         # Combine all document texts
         combined_text = "\n\n".join([doc.page_content for doc in documents])
 
-        if not self.llm:
-            # Simple rule-based extraction for the dummy implementation
-            try:
-                print("Using rule-based extraction as fallback")
-                print(f"Document text length: {len(combined_text)} characters")
-                print(f"First 200 characters: {combined_text[:200]}...")
-
-                # Try to extract some basic information from the text
-                company_name = "Unknown Company"
-                contact_name = None
-                contact_email = None
-                contact_phone = None
-                opportunity_value = None
-                currency = None
-                timeline = None
-                product_interest = []
-                opportunity_stage = None
-                probability = None
-                notes = None
-
-                import re
-
-                # Look for patterns in the text - including Polish language patterns
-                # Company name patterns
-                company_patterns = [
-                    r"Company Name:\s*(.*?)(?:\n|$)",
-                    r"Company:\s*(.*?)(?:\n|$)",
-                    r"Organization:\s*(.*?)(?:\n|$)",
-                    r"Client:\s*(.*?)(?:\n|$)",
-                    r"Firma:\s*(.*?)(?:\n|$)",
-                    r"Nazwa firmy:\s*(.*?)(?:\n|$)",
-                    r"Klient:\s*(.*?)(?:\n|$)"
-                ]
-
-                for pattern in company_patterns:
-                    match = re.search(pattern, combined_text, re.IGNORECASE)
-                    if match:
-                        company_name = match.group(1).strip()
-                        break
+        result, decision = self.router.route(combined_text, self.backends, latency_budget=latency_budget)
+        print(f"Routing plan: {decision.plan}, selected: {decision.selected} ({decision.elapsed:.2f}s)")
+
+        if result is not None:
+            if not normalize:
+                return result
+            with phase("normalization"):
+                return normalize_batch([result])[0]
+        # The router only leaves backends out (of the plan or the run) to stay within the latency budget
+        if len(decision.attempts) < len(self.backends):
+            raise ExtractionTimeout(f"No data found within the {latency_budget}s latency budget; slower backends were skipped")
+        return self._fallback(decision.attempts)
+
+    def extract_speculative(self, documents: List[Document], latency_budget: Optional[float] = None,
+                            normalize: bool = True) -> Tuple[CRMOpportunity, SpeculativeRace]:
+        """
+        Extract CRM opportunity data by running all backends concurrently.
 
-                # Also look for specific Polish format in the text
-                firma_match = re.search(r"Firma:\s*(.*?)(?:\n|$)", combined_text)
-                if firma_match:
-                    company_name = firma_match.group(1).strip()
-
-                # Contact name patterns
-                contact_patterns = [
-                    r"Contact Name:\s*(.*?)(?:\n|$)",
-                    r"Contact:\s*(.*?)(?:\n|$)",
-                    r"Name:\s*(.*?)(?:\n|$)",
-                    r"Person:\s*(.*?)(?:\n|$)",
-                    r"Kontakt do\s*(.*?)(?:\n|$)",
-                    r"Osoba kontaktowa:\s*(.*?)(?:\n|$)",
-                    r"Kontakt:\s*(.*?)(?:\n|$)"
-                ]
-
-                for pattern in contact_patterns:
-                    match = re.search(pattern, combined_text, re.IGNORECASE)
-                    if match:
-                        contact_name = match.group(1).strip()
-                        break
+        The first result that meets the router's field coverage threshold is returned.
+        Backends still running keep going in the background; their fuller result can be
+        collected later from the returned race with `full()` or `add_done_callback()`.
 
-                # Email patterns
-                email_match = re.search(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}", combined_text)
-                if email_match:
-                    contact_email = email_match.group(0)
-
-                # Also look for e-mail: prefix
-                email_prefix_match = re.search(r"e-mail:\s*([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})", combined_text, re.IGNORECASE)
-                if email_prefix_match:
-                    contact_email = email_prefix_match.group(1).strip()
-
-                # Phone patterns
-                phone_patterns = [
-                    r"Phone:\s*([\d\s\(\)\+\-\.]+)(?:\n|$)",
-                    r"Tel(?:ephone)?:\s*([\d\s\(\)\+\-\.]+)(?:\n|$)",
-                    r"Contact(?:\s+Number)?:\s*([\d\s\(\)\+\-\.]+)(?:\n|$)",
-                    r"tel:\s*([\d\s\(\)\+\-\.]+)(?:\n|$)",
-                    r"telefon:\s*([\d\s\(\)\+\-\.]+)(?:\n|$)",
-                    r"(?<!\w)(?:\+\d{1,3}[\s\-\.]?)?\(?\d{3}\)?[\s\-\.]?\d{3}[\s\-\.]?\d{4}(?!\d)",
-                    r"(?<!\w)(?:\+\d{1,2})?[\s\-\.]?\d{3}[\s\-\.]?\d{3}[\s\-\.]?\d{3}(?!\d)"  # Polish format
-                ]
-
-                for pattern in phone_patterns:
-                    match = re.search(pattern, combined_text, re.IGNORECASE)
-                    if match:
-                        contact_phone = match.group(1).strip() if len(match.groups()) > 0 else match.group(0).strip()
-                        break
+        Args:
+            documents: List of Document objects containing text
+            latency_budget: Maximum time in seconds to wait for a complete enough result
+            normalize: Normalize the result (see `extract`)
 
-                # Location patterns (for Polish addresses)
-                location_patterns = [
-                    r"(?:Śląskie|Małopolskie|Mazowieckie|Dolnośląskie|Wielkopolskie|Łódzkie|Pomorskie|Podkarpackie|Lubelskie|Podlaskie|Kujawsko-Pomorskie|Zachodniopomorskie|Warmińsko-Mazurskie|Opolskie|Lubuskie|Świętokrzyskie),\s*(?:powiat|pow\.|p\.)\s*([a-zA-ZąćęłńóśźżĄĆĘŁŃÓŚŹŻ\s-]+),\s*(\d{2}-\d{3}),\s*([a-zA-ZąćęłńóśźżĄĆĘŁŃÓŚŹŻ\s-]+)"
-                ]
+        Returns:
+            Tuple of the CRMOpportunity object and the SpeculativeRace for later enrichment
 
-                for pattern in location_patterns:
-                    match = re.search(pattern, combined_text)
-                    if match:
-                        location = match.group(0).strip()
-                        break
+        Raises:
+            ExtractionTimeout: If no backend produced a result within the latency budget
+        """
+        # Combine all document texts
+        combined_text = "\n\n".join([doc.page_content for doc in documents])
 
-                # Project type patterns
-                project_patterns = [
-                    r"Zakres zlecenia:\s*(.*?)(?:\n|$)",
-                    r"Projekt:\s*(.*?)(?:\n|$)",
-                    r"Zlecenie na\s*(.*?)(?:\n|$)",
-                    r"wykonanie\s*(.*?)(?:\n|$)"
-                ]
-
-                for pattern in project_patterns:
-                    match = re.search(pattern, combined_text, re.IGNORECASE)
-                    if match:
-                        project_type = match.group(1).strip()
-                        break
+        race = SpeculativeRace(self.router, combined_text, self.backends)
+        result = race.first(timeout=latency_budget)
+        print(f"Speculative extraction winner: {race.winner}")
 
-                # Industry patterns
-                industry_patterns = [
-                    r"Branża(?:\s+sklepu)?:\s*(.*?)(?:\n|$)",
-                    r"Industry:\s*(.*?)(?:\n|$)",
-                    r"Sector:\s*(.*?)(?:\n|$)"
-                ]
-
-                for pattern in industry_patterns:
-                    match = re.search(pattern, combined_text, re.IGNORECASE)
-                    if match:
-                        industry = match.group(1).strip()
-                        break
+        if result is not None:
+            if not normalize:
+                return result, race
+            with phase("normalization"):
+                return normalize_batch([result])[0], race
+        if not race.done():
+            raise ExtractionTimeout(f"No backend produced a result within {latency_budget}s", race=race)
+        return self._fallback(race.attempts), race
 
-                # Product count patterns
-                product_count_patterns = [
-                    r"(?:Orientacyjna\s+)?[Ll]iczba\s+produktów:\s*(.*?)(?:\n|$)",
-                    r"Number of products:\s*(.*?)(?:\n|$)",
-                    r"Products count:\s*(.*?)(?:\n|$)"
-                ]
-
-                for pattern in product_count_patterns:
-                    match = re.search(pattern, combined_text, re.IGNORECASE)
-                    if match:
-                        product_count = match.group(1).strip()
-                        break
+    def _fallback(self, attempts: List[BackendAttempt]) -> CRMOpportunity:
+        """
+        Handle the case where every backend finished without producing a result.
 
-                # Design requirements patterns
-                design_patterns = [
-                    r"Projekt graficzny:\s*(.*?)(?:\n|$)",
-                    r"Design:\s*(.*?)(?:\n|$)",
-                    r"Graphics:\s*(.*?)(?:\n|$)"
-                ]
-
-                for pattern in design_patterns:
-                    match = re.search(pattern, combined_text, re.IGNORECASE)
-                    if match:
-                        design_requirements = match.group(1).strip()
-                        break
+        Args:
+            attempts: Backend attempts made for the document
 
-                # Integration requirements patterns
-                integration_patterns = [
-                    r"Integracje:\s*(.*?)(?:\n\n|\n[A-Z]|$)",
-                    r"Integrations:\s*(.*?)(?:\n\n|\n[A-Z]|$)"
-                ]
-
-                integration_requirements = []
-                for pattern in integration_patterns:
-                    match = re.search(pattern, combined_text, re.IGNORECASE | re.DOTALL)
-                    if match:
-                        integrations_text = match.group(1).strip()
-                        # Try to split by commas or new lines
-                        if ',' in integrations_text:
-                            integration_requirements = [p.strip() for p in integrations_text.split(',')]
-                        else:
-                            integration_requirements = [p.strip() for p in integrations_text.split('\n') if p.strip()]
-                        break
+        Returns:
+            CRMOpportunity object with dummy data if no backend raised an error
+        """
+        errors = [attempt.error for attempt in attempts if attempt.error]
+        if errors:
+            raise Exception(errors[-1])
+
+        # If we couldn't extract ANYTHING meaningful, use default values
+        print("Extraction failed to find any meaningful data, using dummy data")
+        return CRMOpportunity(
+            company_name="Example Company",
+            contact_name="John Doe",
+            contact_email="john.doe@example.com",
+            opportunity_value=10000,
+            currency="USD",
+            notes="This is dummy data because extraction failed. The text may not contain structured CRM data."
+        )
 
-                # Other requirements patterns
-                other_req_patterns = [
-                    r"Inne potrzeby Klienta:\s*(.*?)(?:\n\n|\n[A-Z]|$)",
-                    r"Other requirements:\s*(.*?)(?:\n\n|\n[A-Z]|$)"
-                ]
-
-                other_requirements = []
-                for pattern in other_req_patterns:
-                    match = re.search(pattern, combined_text, re.IGNORECASE | re.DOTALL)
-                    if match:
-                        reqs_text = match.group(1).strip()
-                        # Try to split by commas or new lines
-                        if ',' in reqs_text:
-                            other_requirements = [p.strip() for p in reqs_text.split(',')]
-                        else:
-                            other_requirements = [p.strip() for p in reqs_text.split('\n') if p.strip()]
-                        break
+    def _extract_with_rules(self, combined_text: str) -> Optional[CRMOpportunity]:
+        """
+        Extract CRM opportunity data using regular expression patterns.
 
-                # Timeline patterns
-                timeline_patterns = [
-                    r"Timeline:?\s*(.*?)(?:\n|$)",
-                    r"Deadline:?\s*(.*?)(?:\n|$)",
-                    r"Time frame:?\s*(.*?)(?:\n|$)",
-                    r"Schedule:?\s*(.*?)(?:\n|$)",
-                    r"Termin realizacji(?:\s+usługi)?:\s*(.*?)(?:\n|$)",
-                    r"(?:Q[1-4]|Quarter [1-4])[\s\-]?20\d\d"
-                ]
-
-                for pattern in timeline_patterns:
-                    match = re.search(pattern, combined_text, re.IGNORECASE)
-                    if match:
-                        timeline = match.group(1).strip() if len(match.groups()) > 0 else match.group(0).strip()
-                        break
+        Args:
+            combined_text: Document text
 
-                # Notes patterns
-                notes_patterns = [
-                    r"Notes:?\s*(.*?)(?=\n\n|\Z)",
-                    r"Comments:?\s*(.*?)(?=\n\n|\Z)",
-                    r"Additional Information:?\s*(.*?)(?=\n\n|\Z)",
-                    r"Description:?\s*(.*?)(?=\n\n|\Z)",
-                    r"Details:?\s*(.*?)(?=\n\n|\Z)"
-                ]
-
-                for pattern in notes_patterns:
-                    match = re.search(pattern, combined_text, re.IGNORECASE | re.DOTALL)
-                    if match:
-                        notes = match.group(1).strip()
+        Returns:
+            CRMOpportunity object, or None if nothing meaningful was found
+        """
+        with phase("rules"):
+            return self._run_rules(combined_text, RuleBudget.from_env())
+
+    def _run_rules(self, combined_text: str, budget: RuleBudget) -> Optional[CRMOpportunity]:
+        """
+        Apply the rule-based patterns to the document text.
+
+        Patterns only scan bounded windows of the text, and once the budget's time
+        runs out the remaining patterns are skipped, so the result may be partial.
+        """
+        try:
+            combined_text = budget.limit_input(combined_text)
+
+            print("Using rule-based extraction")
+            print(f"Document text length: {len(combined_text)} characters")
+            print(f"First 200 characters: {combined_text[:200]}...")
+
+            # Try to extract some basic information from the text
+            company_name = "Unknown Company"
+            contact_name = None
+            contact_email = None
+            contact_phone = None
+            opportunity_value = None
+            currency = None
+            timeline = None
+            product_interest = []
+            opportunity_stage = None
+            probability = None
+            notes = None
+
+            import re
+
+            # Look for patterns in the text - including Polish language patterns
+            # Company name patterns
+            company_patterns = [
+                r"Company Name:\s*(.*?)(?:\n|$)",
+                r"Company:\s*(.*?)(?:\n|$)",
+                r"Organization:\s*(.*?)(?:\n|$)",
+                r"Client:\s*(.*?)(?:\n|$)",
+                r"Firma:\s*(.*?)(?:\n|$)",
+                r"Nazwa firmy:\s*(.*?)(?:\n|$)",
+                r"Klient:\s*(.*?)(?:\n|$)"
+            ]
+
+            for pattern in company_patterns:
+                match = budget.search(pattern, combined_text, re.IGNORECASE)
+                if match:
+                    company_name = match.group(1).strip()
+                    break
+
+            # Also look for specific Polish format in the text
+            firma_match = budget.search(r"Firma:\s*(.*?)(?:\n|$)", combined_text)
+            if firma_match:
+                company_name = firma_match.group(1).strip()
+
+            # Contact name patterns
+            contact_patterns = [
+                r"Contact Name:\s*(.*?)(?:\n|$)",
+                r"Contact:\s*(.*?)(?:\n|$)",
+                r"Name:\s*(.*?)(?:\n|$)",
+                r"Person:\s*(.*?)(?:\n|$)",
+                r"Kontakt do\s*(.*?)(?:\n|$)",
+                r"Osoba kontaktowa:\s*(.*?)(?:\n|$)",
+                r"Kontakt:\s*(.*?)(?:\n|$)"
+            ]
+
+            for pattern in contact_patterns:
+                match = budget.search(pattern, combined_text, re.IGNORECASE)
+                if match:
+                    contact_name = match.group(1).strip()
+                    break
+
+            # Email patterns
+            email_match = budget.search(r"(?<![a-zA-Z0-9._%+-])[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}", combined_text)
+            if email_match:
+                contact_email = email_match.group(0)
+
+            # Also look for e-mail: prefix
+            email_prefix_match = budget.search(r"e-mail:\s*([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})", combined_text, re.IGNORECASE)
+            if email_prefix_match:
+                contact_email = email_prefix_match.group(1).strip()
+
+            # Phone patterns
+            phone_patterns = [
+                r"Phone:\s*([\d\s\(\)\+\-\.]+)(?:\n|$)",
+                r"Tel(?:ephone)?:\s*([\d\s\(\)\+\-\.]+)(?:\n|$)",
+                r"Contact(?:\s+Number)?:\s*([\d\s\(\)\+\-\.]+)(?:\n|$)",
+                r"tel:\s*([\d\s\(\)\+\-\.]+)(?:\n|$)",
+                r"telefon:\s*([\d\s\(\)\+\-\.]+)(?:\n|$)",
+                r"(?<!\w)(?:\+\d{1,3}[\s\-\.]?)?\(?\d{3}\)?[\s\-\.]?\d{3}[\s\-\.]?\d{4}(?!\d)",
+                r"(?<!\w)(?:\+\d{1,2})?[\s\-\.]?\d{3}[\s\-\.]?\d{3}[\s\-\.]?\d{3}(?!\d)"  # Polish format
+            ]
+
+            for pattern in phone_patterns:
+                match = budget.search(pattern, combined_text, re.IGNORECASE)
+                if match:
+                    contact_phone = match.group(1).strip() if len(match.groups()) > 0 else match.group(0).strip()
+                    break
+
+            # Location patterns (for Polish addresses)
+            location_patterns = [
+                r"(?:Śląskie|Małopolskie|Mazowieckie|Dolnośląskie|Wielkopolskie|Łódzkie|Pomorskie|Podkarpackie|Lubelskie|Podlaskie|Kujawsko-Pomorskie|Zachodniopomorskie|Warmińsko-Mazurskie|Opolskie|Lubuskie|Świętokrzyskie),\s*(?:powiat|pow\.|p\.)\s*([a-zA-ZąćęłńóśźżĄĆĘŁŃÓŚŹŻ\s-]+),\s*(\d{2}-\d{3}),\s*([a-zA-ZąćęłńóśźżĄĆĘŁŃÓŚŹŻ\s-]+)"
+            ]
+
+            for pattern in location_patterns:
+                match = budget.search(pattern, combined_text)
+                if match:
+                    location = match.group(0).strip()
+                    break
+
+            # Project type patterns
+            project_patterns = [
+                r"Zakres zlecenia:\s*(.*?)(?:\n|$)",
+                r"Projekt:\s*(.*?)(?:\n|$)",
+                r"Zlecenie na\s*(.*?)(?:\n|$)",
+                r"wykonanie\s*(.*?)(?:\n|$)"
+            ]
+
+            for pattern in project_patterns:
+                match = budget.search(pattern, combined_text, re.IGNORECASE)
+                if match:
+                    project_type = match.group(1).strip()
+                    break
+
+            # Industry patterns
+            industry_patterns = [
+                r"Branża(?:\s+sklepu)?:\s*(.*?)(?:\n|$)",
+                r"Industry:\s*(.*?)(?:\n|$)",
+                r"Sector:\s*(.*?)(?:\n|$)"
+            ]
+
+            for pattern in industry_patterns:
+                match = budget.search(pattern, combined_text, re.IGNORECASE)
+                if match:
+                    industry = match.group(1).strip()
+                    break
+
+            # Product count patterns
+            product_count_patterns = [
+                r"(?:Orientacyjna\s+)?[Ll]iczba\s+produktów:\s*(.*?)(?:\n|$)",
+                r"Number of products:\s*(.*?)(?:\n|$)",
+                r"Products count:\s*(.*?)(?:\n|$)"
+            ]
+
+            for pattern in product_count_patterns:
+                match = budget.search(pattern, combined_text, re.IGNORECASE)
+                if match:
+                    product_count = match.group(1).strip()
+                    break
+
+            # Design requirements patterns
+            design_patterns = [
+                r"Projekt graficzny:\s*(.*?)(?:\n|$)",
+                r"Design:\s*(.*?)(?:\n|$)",
+                r"Graphics:\s*(.*?)(?:\n|$)"
+            ]
+
+            for pattern in design_patterns:
+                match = budget.search(pattern, combined_text, re.IGNORECASE)
+                if match:
+                    design_requirements = match.group(1).strip()
+                    break
+
+            # Integration requirements patterns
+            integration_patterns = [
+                r"Integracje:\s*(.*?)(?:\n\n|\n[A-Z]|$)",
+                r"Integrations:\s*(.*?)(?:\n\n|\n[A-Z]|$)"
+            ]
+
+            integration_requirements = []
+            for pattern in integration_patterns:
+                match = budget.search(pattern, combined_text, re.IGNORECASE | re.DOTALL)
+                if match:
+                    integrations_text = match.group(1).strip()
+                    # Try to split by commas or new lines
+                    if ',' in integrations_text:
+                        integration_requirements = [p.strip() for p in integrations_text.split(',')]
+                    else:
+                        integration_requirements = [p.strip() for p in integrations_text.split('\n') if p.strip()]
+                    break
+
+            # Other requirements patterns
+            other_req_patterns = [
+                r"Inne potrzeby Klienta:\s*(.*?)(?:\n\n|\n[A-Z]|$)",
+                r"Other requirements:\s*(.*?)(?:\n\n|\n[A-Z]|$)"
+            ]
+
+            other_requirements = []
+            for pattern in other_req_patterns:
+                match = budget.search(pattern, combined_text, re.IGNORECASE | re.DOTALL)
+                if match:
+                    reqs_text = match.group(1).strip()
+                    # Try to split by commas or new lines
+                    if ',' in reqs_text:
+                        other_requirements = [p.strip() for p in reqs_text.split(',')]
+                    else:
+                        other_requirements = [p.strip() for p in reqs_text.split('\n') if p.strip()]
+                    break
+
+            # Opportunity value patterns
+            value_patterns = [
+                r"(?:Opportunity\s+)?Value:\s*(.*?)(?:\n|$)",
+                r"Budget:\s*(.*?)(?:\n|$)",
+                r"Budżet:\s*(.*?)(?:\n|$)",
+                r"Wartość(?:\s+zamówienia|\s+zlecenia)?:\s*(.*?)(?:\n|$)",
+                r"Kwota:\s*(.*?)(?:\n|$)"
+            ]
+
+            for pattern in value_patterns:
+                match = budget.search(pattern, combined_text, re.IGNORECASE)
+                if match:
+                    opportunity_value, currency = parse_amount(match.group(1).strip())
+                    if opportunity_value is not None:
                         break
 
-                # If we still don't have notes, try to extract the last paragraph
-                if not notes and len(combined_text.strip()) > 0:
-                    paragraphs = [p for p in combined_text.split('\n\n') if p.strip()]
-                    if paragraphs and len(paragraphs) > 3:  # Only use last paragraph if we have several
-                        notes = paragraphs[-1].strip()
-
-                # Print what we extracted
-                print(f"Extracted data from rule-based approach:")
-                print(f"  Company: {company_name}")
-                print(f"  Contact: {contact_name}")
-                print(f"  Email: {contact_email}")
-                print(f"  Phone: {contact_phone}")
-                print(f"  Value: {opportunity_value} {currency}")
-                print(f"  Timeline: {timeline}")
-                print(f"  Products: {product_interest}")
-                print(f"  Stage: {opportunity_stage}")
-                print(f"  Probability: {probability}")
-
-                # If we couldn't extract ANYTHING meaningful, use default values
-                if (company_name == "Unknown Company" and not contact_name and
-                    not contact_email and not opportunity_value and not product_interest):
-                    print("Extraction failed to find any meaningful data, using dummy data")
-                    return CRMOpportunity(
-                        company_name="Example Company",
-                        contact_name="John Doe",
-                        contact_email="john.doe@example.com",
-                        opportunity_value=10000,
-                        currency="USD",
-                        notes="This is dummy data because extraction failed. The text may not contain structured CRM data."
-                    )
-
-                return CRMOpportunity(
-                    company_name=company_name,
-                    contact_name=contact_name,
-                    contact_email=contact_email,
-                    contact_phone=contact_phone,
-                    opportunity_value=opportunity_value,
-                    currency=currency,
-                    timeline=timeline,
-                    product_interest=product_interest if product_interest else None,
-                    opportunity_stage=opportunity_stage,
-                    probability=probability,
-                    notes=notes,
-                    # Additional fields
-                    location=location if 'location' in locals() else None,
-                    project_type=project_type if 'project_type' in locals() else None,
-                    industry=industry if 'industry' in locals() else None,
-                    product_count=product_count if 'product_count' in locals() else None,
-                    design_requirements=design_requirements if 'design_requirements' in locals() else None,
-                    integration_requirements=integration_requirements if 'integration_requirements' in locals() and integration_requirements else None,
-                    other_requirements=other_requirements if 'other_requirements' in locals() and other_requirements else None
-                )
-            except Exception as e:
-                print(f"Error in dummy extraction: {str(e)}")
-                # Fallback to very basic dummy data
-                return CRMOpportunity(
-                    company_name="Example Company",
-                    contact_name="John Doe",
-                    contact_email="john.doe@example.com",
-                    opportunity_value=10000,
-                    currency="USD",
-                    notes="This is dummy data because no OpenAI API key was provided."
-                )
+            # Probability patterns
+            probability_patterns = [
+                r"Probability:\s*(.*?)(?:\n|$)",
+                r"Prawdopodobieństwo:\s*(.*?)(?:\n|$)"
+            ]
+
+            for pattern in probability_patterns:
+                match = budget.search(pattern, combined_text, re.IGNORECASE)
+                if match:
+                    probability = parse_probability(match.group(1).strip())
+                    break
+
+            # Timeline patterns
+            timeline_patterns = [
+                r"Timeline:?\s*(.*?)(?:\n|$)",
+                r"Deadline:?\s*(.*?)(?:\n|$)",
+                r"Time frame:?\s*(.*?)(?:\n|$)",
+                r"Schedule:?\s*(.*?)(?:\n|$)",
+                r"Termin realizacji(?:\s+usługi)?:\s*(.*?)(?:\n|$)",
+                r"(?:Q[1-4]|Quarter [1-4])[\s\-]?20\d\d"
+            ]
+
+            for pattern in timeline_patterns:
+                match = budget.search(pattern, combined_text, re.IGNORECASE)
+                if match:
+                    timeline = match.group(1).strip() if len(match.groups()) > 0 else match.group(0).strip()
+                    break
+
+            # Notes patterns
+            notes_patterns = [
+                r"Notes:?\s*(.*?)(?=\n\n|\Z)",
+                r"Comments:?\s*(.*?)(?=\n\n|\Z)",
+                r"Additional Information:?\s*(.*?)(?=\n\n|\Z)",
+                r"Description:?\s*(.*?)(?=\n\n|\Z)",
+                r"Details:?\s*(.*?)(?=\n\n|\Z)"
+            ]
+
+            for pattern in notes_patterns:
+                match = budget.search(pattern, combined_text, re.IGNORECASE | re.DOTALL)
+                if match:
+                    notes = match.group(1).strip()
+                    break
+
+            # If we still don't have notes, try to extract the last paragraph
+            if not notes and len(combined_text.strip()) > 0:
+                paragraphs = [p for p in combined_text.split('\n\n') if p.strip()]
+                if paragraphs and len(paragraphs) > 3:  # Only use last paragraph if we have several
+                    notes = paragraphs[-1].strip()
+
+            # Print what we extracted
+            print(f"Extracted data from rule-based approach:")
+            print(f"  Company: {company_name}")
+            print(f"  Contact: {contact_name}")
+            print(f"  Email: {contact_email}")
+            print(f"  Phone: {contact_phone}")
+            print(f"  Value: {opportunity_value} {currency}")
+            print(f"  Timeline: {timeline}")
+            print(f"  Products: {product_interest}")
+            print(f"  Stage: {opportunity_stage}")
+            print(f"  Probability: {probability}")
+
+            # If we couldn't extract ANYTHING meaningful, let the caller decide what to do
+            if (company_name == "Unknown Company" and not contact_name and
+                not contact_email and not opportunity_value and not product_interest):
+                return None
+
+            return CRMOpportunity(
+                company_name=company_name,
+                contact_name=contact_name,
+                contact_email=contact_email,
+                contact_phone=contact_phone,
+                opportunity_value=opportunity_value,
+                currency=currency,
+                timeline=timeline,
+                product_interest=product_interest if product_interest else None,
+                opportunity_stage=opportunity_stage,
+                probability=probability,
+                notes=notes,
+                # Additional fields
+                location=location if 'location' in locals() else None,
+                project_type=project_type if 'project_type' in locals() else None,
+                industry=industry if 'industry' in locals() else None,
+                product_count=product_count if 'product_count' in locals() else None,
+                design_requirements=design_requirements if 'design_requirements' in locals() else None,
+                integration_requirements=integration_requirements if 'integration_requirements' in locals() and integration_requirements else None,
+                other_requirements=other_requirements if 'other_requirements' in locals() and other_requirements else None
+            )
+        except Exception as e:
+            print(f"Error in rule-based extraction: {str(e)}")
+            return None
+
+    def _extract_with_chain(self, chain: LLMChain, combined_text: str) -> CRMOpportunity:
+        """
+        Extract CRM opportunity data using an LLM chain.
 
+        Args:
+            chain: LLM chain wrapping the prompt template
+            combined_text: Document text
+
+        Returns:
+            CRMOpportunity object with extracted data
+        """
         try:
             # Run the extraction chain
-            result = self.chain.invoke({"document_text": combined_text})
-
-            # Parse the JSON result
-            import json
+            with phase("inference"):
+                result = chain.invoke({"document_text": combined_text})
+            return self._parse_response(result)
 
-            # Handle different response formats from different LangChain versions
-            if isinstance(result, dict) and 'text' in result:
-                json_str = result['text']
-            elif isinstance(result, str):
-                json_str = result
-            else:
-                json_str = str(result)
+        except Exception as e:
+            raise Exception(f"Error extracting CRM data: {str(e)}")
 
-            # Clean up the JSON string if needed
-            json_str = json_str.strip()
-            if json_str.startswith('```json'):
-                json_str = json_str[7:]
-            if json_str.endswith('```'):
-                json_str = json_str[:-3]
-            json_str = json_str.strip()
+    def _extract_with_server(self, combined_text: str) -> CRMOpportunity:
+        """
+        Extract CRM opportunity data using the standalone model server.
 
-            # Parse the JSON
-            crm_data = json.loads(json_str)
+        Args:
+            combined_text: Document text
 
-            # Create and return a CRMOpportunity object
-            return CRMOpportunity(**crm_data)
+        Returns:
+            CRMOpportunity object with extracted data
+        """
+        try:
+            with phase("inference"):
+                result = self.model_server.complete([combined_text])[0]
+            return self._parse_response(result)
 
         except Exception as e:
             raise Exception(f"Error extracting CRM data: {str(e)}")
+
+    def _parse_response(self, result) -> CRMOpportunity:
+        """
+        Parse an LLM response into a CRMOpportunity object.
+
+        Args:
+            result: Chain output (dict or string) or raw completion text
+
+        Returns:
+            CRMOpportunity object with extracted data
+        """
+        # Parse the JSON result
+        import json
+
+        # Handle different response formats from different LangChain versions
+        if isinstance(result, dict) and 'text' in result:
+            json_str = result['text']
+        elif isinstance(result, str):
+            json_str = result
+        else:
+            json_str = str(result)
+
+        # Clean up the JSON string if needed
+        json_str = json_str.strip()
+        if json_str.startswith('```json'):
+            json_str = json_str[7:]
+        if json_str.endswith('```'):
+            json_str = json_str[:-3]
+        json_str = json_str.strip()
+
+        # Parse the JSON
+        with phase("json_parsing"):
+            crm_data = json.loads(json_str)
+
+        # Models may answer with a fraction or a "65%" string; scale like the rule engine does
+        if crm_data.get("probability") is not None:
+            crm_data["probability"] = parse_probability(str(crm_data["probability"]))
+
+        # Create and return a CRMOpportunity object
+        with phase("validation"):
+            return CRMOpportunity(**crm_data)
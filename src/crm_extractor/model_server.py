@@ -0,0 +1,288 @@
+"""
+Model Server Module
+
+This module runs the local GGUF model in a standalone process that listens on a
+Unix socket (or a TCP port where Unix sockets are unavailable), so the model stays
+loaded across web app restarts and can be shared by several front-ends.
+
+Messages are msgpack maps sent as frames prefixed with a 4-byte big-endian length.
+A request is either {"op": "ping"} or {"op": "extract", "documents": [text, ...]};
+the response to an extract request carries one completion (or error) per document.
+
+Run the server with:
+    python -m src.crm_extractor.model_server --address /tmp/crm-model.sock
+"""
+
+import os
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+from typing import List, Optional, Tuple, Union
+
+import msgpack
+
+# Seconds the client waits for an extraction when neither MODEL_SERVER_TIMEOUT nor
+# EXTRACTION_LATENCY_BUDGET is set
+DEFAULT_TIMEOUT = 120.0
+
+# Hosts a TCP server may bind to without MODEL_SERVER_ALLOW_REMOTE
+LOOPBACK_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+# Frames larger than this are rejected to protect both ends from runaway input
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+_HEADER = struct.Struct(">I")
+
+
+def parse_address(address: str) -> Tuple[int, Union[str, Tuple[str, int]]]:
+    """
+    Parse a server address into a socket family and address.
+
+    Args:
+        address: Unix socket path (optionally prefixed with "unix:") or "host:port"
+
+    Returns:
+        Tuple of the socket family and the address to bind or connect to
+    """
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit() and os.sep not in address:
+        return socket.AF_INET, (host, int(port))
+
+    return socket.AF_UNIX, address
+
+
+def send_frame(sock: socket.socket, message: dict):
+    """Encode a message and send it as one length-prefixed frame."""
+    payload = msgpack.packb(message, use_bin_type=True)
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def recv_frame(sock: socket.socket) -> Optional[dict]:
+    """
+    Receive one length-prefixed frame and decode it.
+
+    Returns:
+        The decoded message, or None if the connection was closed
+    """
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+
+    (length,) = _HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {length} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+
+    payload = _recv_exactly(sock, length)
+    if payload is None:
+        return None
+    return msgpack.unpackb(payload, raw=False)
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> Optional[bytes]:
+    """Read exactly `size` bytes, or return None if the peer closed the connection."""
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = sock.recv(min(remaining, 65536))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+class ModelServerClient:
+    """Client for a running model server."""
+
+    def __init__(self, address: str, timeout: Optional[float] = None):
+        """
+        Initialize the client.
+
+        Args:
+            address: Server address (Unix socket path or "host:port")
+            timeout: Socket timeout in seconds for extraction requests (defaults to
+                MODEL_SERVER_TIMEOUT, then EXTRACTION_LATENCY_BUDGET, then 120s)
+        """
+        if timeout is None:
+            timeout = float(os.getenv("MODEL_SERVER_TIMEOUT") or os.getenv("EXTRACTION_LATENCY_BUDGET")
+                            or DEFAULT_TIMEOUT)
+
+        self.address = address
+        self.timeout = timeout
+        self.family, self.sock_address = parse_address(address)
+
+    def ping(self) -> bool:
+        """Return True if the server is up and has a model loaded."""
+        try:
+            response = self._request({"op": "ping"}, timeout=2.0)
+            return bool(response.get("ok"))
+        except (OSError, ValueError):
+            return False
+
+    def complete(self, documents: List[str]) -> List[str]:
+        """
+        Run the extraction prompt over a batch of documents.
+
+        Args:
+            documents: Document texts
+
+        Returns:
+            Raw model completion for each document, in order
+        """
+        response = self._request({"op": "extract", "documents": documents}, timeout=self.timeout)
+        if not response.get("ok"):
+            raise Exception(response.get("error", "Model server request failed"))
+
+        completions = []
+        for completion, error in zip(response["completions"], response["errors"]):
+            if error:
+                raise Exception(error)
+            completions.append(completion)
+        return completions
+
+    def _request(self, message: dict, timeout: Optional[float]) -> dict:
+        """Send one request over a fresh connection and return the response."""
+        with socket.socket(self.family, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(self.sock_address)
+            send_frame(sock, message)
+            response = recv_frame(sock)
+        if response is None:
+            raise ValueError("Model server closed the connection")
+        return response
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    """Handles requests on one client connection."""
+
+    def handle(self):
+        while True:
+            try:
+                message = recv_frame(self.request)
+            except (OSError, ValueError) as e:
+                print(f"Error reading request: {str(e)}")
+                return
+            if message is None:
+                return
+
+            send_frame(self.request, self.server.model_server.handle(message))
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ModelServer:
+    """Standalone process that owns the local model and serves extraction requests."""
+
+    def __init__(self, address: str, model_path: Optional[str] = None):
+        """
+        Load the local model.
+
+        Args:
+            address: Address to listen on (Unix socket path or "host:port")
+            model_path: Path to the GGUF model (defaults to LOCAL_MODEL_PATH or the bundled default)
+        """
+        from langchain_community.llms import CTransformers
+        from .extractor import DEFAULT_MODEL_PATH, EXTRACTION_PROMPT, LOCAL_MODEL_CONFIG
+
+        self.address = address
+        self.model_path = os.path.abspath(model_path or os.getenv("LOCAL_MODEL_PATH", DEFAULT_MODEL_PATH))
+        self.prompt = EXTRACTION_PROMPT
+
+        print(f"Loading model: {self.model_path}")
+        self.llm = CTransformers(model=self.model_path, model_type="mistral", config=LOCAL_MODEL_CONFIG)
+        print("Successfully loaded the model!")
+
+        # The model is not thread-safe; connections are served concurrently but inference is serialized
+        self._inference_lock = threading.Lock()
+
+    def handle(self, message: dict) -> dict:
+        """
+        Handle one decoded request.
+
+        Args:
+            message: Decoded request frame
+
+        Returns:
+            Response message
+        """
+        if not isinstance(message, dict):
+            return {"ok": False, "error": "Request must be a map"}
+
+        op = message.get("op")
+        if op == "ping":
+            return {"ok": True, "model": self.model_path}
+        if op != "extract":
+            return {"ok": False, "error": f"Unknown operation: {op}"}
+
+        documents = message.get("documents") or []
+        if not isinstance(documents, list) or not all(isinstance(text, str) for text in documents):
+            return {"ok": False, "error": "documents must be a list of strings"}
+        completions = []
+        errors = []
+        with self._inference_lock:
+            for text in documents:
+                try:
+                    completions.append(self.llm.invoke(self.prompt.format(document_text=text)))
+                    errors.append(None)
+                except Exception as e:
+                    completions.append(None)
+                    errors.append(str(e))
+
+        return {"ok": True, "completions": completions, "errors": errors}
+
+    def serve_forever(self):
+        """Listen for requests until interrupted."""
+        family, sock_address = parse_address(self.address)
+        # The protocol has no authentication, so only listen on loopback unless told otherwise
+        if (family == socket.AF_INET and sock_address[0] not in LOOPBACK_HOSTS and
+                os.getenv("MODEL_SERVER_ALLOW_REMOTE", "").lower() not in ("1", "true", "yes")):
+            raise ValueError(
+                f"Refusing to listen on {sock_address[0]}: the model server has no authentication. "
+                "Use a loopback address or set MODEL_SERVER_ALLOW_REMOTE=true on a trusted network."
+            )
+
+        if family == socket.AF_UNIX:
+            if os.path.exists(sock_address):
+                os.remove(sock_address)
+            server = _UnixServer(sock_address, _RequestHandler)
+        else:
+            server = _TCPServer(sock_address, _RequestHandler)
+        server.model_server = self
+
+        print(f"Model server listening on {self.address}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("Shutting down model server")
+        finally:
+            server.server_close()
+            if family == socket.AF_UNIX and os.path.exists(sock_address):
+                os.remove(sock_address)
+
+
+def main():
+    """Command-line entry point for the model server."""
+    parser = argparse.ArgumentParser(description="Serve the local CRM extraction model over a socket.")
+    parser.add_argument("--address", default=os.getenv("MODEL_SERVER_ADDRESS", "/tmp/crm-model.sock"),
+                        help="Unix socket path or host:port to listen on")
+    parser.add_argument("--model", default=None, help="Path to the GGUF model file")
+    args = parser.parse_args()
+
+    ModelServer(args.address, args.model).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+"""
+Normalization Module
+
+This module normalizes extracted CRM values (amounts, currencies, probabilities,
+phone numbers, dates and Polish addresses) so downstream CRM imports do not have
+to re-parse free text.
+
+Normalization runs column by column over a batch of results: each field's distinct
+values are parsed once through cached parsers backed by precomputed lookup tables,
+so large batches with repeated values cost little more than their unique values.
+"""
+
+import re
+import time
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel
+
+# Currency symbols and words mapped to ISO 4217 codes
+CURRENCY_CODES = {
+    "zł": "PLN", "zl": "PLN", "pln": "PLN", "złotych": "PLN", "zlotych": "PLN",
+    "$": "USD", "usd": "USD", "us$": "USD", "dolarów": "USD", "dollars": "USD",
+    "€": "EUR", "eur": "EUR", "euro": "EUR",
+    "£": "GBP", "gbp": "GBP",
+    "chf": "CHF", "czk": "CZK", "kč": "CZK",
+}
+
+# Active ISO 4217 codes accepted when a currency is given as a bare three-letter code
+ISO_CURRENCY_CODES = frozenset("""
+    AED AFN ALL AMD ANG AOA ARS AUD AWG AZN BAM BBD BDT BGN BHD BIF BMD BND BOB BRL BSD BTN
+    BWP BYN BZD CAD CDF CHF CLP CNY COP CRC CUP CVE CZK DJF DKK DOP DZD EGP ERN ETB EUR FJD
+    FKP GBP GEL GHS GIP GMD GNF GTQ GYD HKD HNL HTG HUF IDR ILS INR IQD IRR ISK JMD JOD JPY
+    KES KGS KHR KMF KPW KRW KWD KYD KZT LAK LBP LKR LRD LSL LYD MAD MDL MGA MKD MMK MNT MOP
+    MRU MUR MVR MWK MXN MYR MZN NAD NGN NIO NOK NPR NZD OMR PAB PEN PGK PHP PKR PLN PYG QAR
+    RON RSD RUB RWF SAR SBD SCR SDG SEK SGD SHP SLE SOS SRD SSP STN SYP SZL THB TJS TMT TND
+    TOP TRY TTD TWD TZS UAH UGX USD UYU UZS VES VND VUV WST XAF XCD XOF XPF YER ZAR ZMW ZWL
+""".split())
+
+# Magnitude suffixes used in Polish and English amounts
+AMOUNT_MULTIPLIERS = {
+    "k": 1e3, "tys": 1e3, "tys.": 1e3, "tysięcy": 1e3, "thousand": 1e3,
+    "m": 1e6, "mln": 1e6, "mln.": 1e6, "milionów": 1e6, "million": 1e6,
+    "mld": 1e9, "billion": 1e9,
+}
+
+# Polish voivodeships keyed by their ASCII-folded lowercase name
+VOIVODESHIPS = {
+    "dolnoslaskie": "Dolnośląskie",
+    "kujawsko-pomorskie": "Kujawsko-Pomorskie",
+    "lubelskie": "Lubelskie",
+    "lubuskie": "Lubuskie",
+    "lodzkie": "Łódzkie",
+    "malopolskie": "Małopolskie",
+    "mazowieckie": "Mazowieckie",
+    "opolskie": "Opolskie",
+    "podkarpackie": "Podkarpackie",
+    "podlaskie": "Podlaskie",
+    "pomorskie": "Pomorskie",
+    "slaskie": "Śląskie",
+    "swietokrzyskie": "Świętokrzyskie",
+    "warminsko-mazurskie": "Warmińsko-Mazurskie",
+    "wielkopolskie": "Wielkopolskie",
+    "zachodniopomorskie": "Zachodniopomorskie",
+}
+
+# Month names (Polish nominative and genitive, English full and short) to month numbers
+MONTHS = {
+    "styczen": 1, "stycznia": 1, "luty": 2, "lutego": 2, "marzec": 3, "marca": 3,
+    "kwiecien": 4, "kwietnia": 4, "maj": 5, "maja": 5, "czerwiec": 6, "czerwca": 6,
+    "lipiec": 7, "lipca": 7, "sierpien": 8, "sierpnia": 8, "wrzesien": 9, "wrzesnia": 9,
+    "pazdziernik": 10, "pazdziernika": 10, "listopad": 11, "listopada": 11,
+    "grudzien": 12, "grudnia": 12,
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6,
+    "july": 7, "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "jun": 6, "jul": 7, "aug": 8,
+    "sep": 9, "sept": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+# Roman numerals used for quarters in Polish ("III kwartał 2025")
+ROMAN_QUARTERS = {"i": 1, "ii": 2, "iii": 3, "iv": 4}
+
+# Country calling code assumed for 9-digit numbers without a trunk 0 (the Polish numbering plan);
+# other numbers without an explicit country code are left alone, since their country is ambiguous
+NATIONAL_COUNTRY_CODE = "48"
+NATIONAL_NUMBER_LENGTH = 9
+
+_ASCII_FOLD = str.maketrans("ąćęłńóśźżĄĆĘŁŃÓŚŹŻ", "acelnoszzACELNOSZZ")
+
+# Whitespace only groups thousands ("12 500"), so "5, 10" is read as two numbers, not 5.10
+_NUMBER_PATTERN = re.compile(r"[-+]?\d+(?:[.,']\d+|\s\d{3}(?!\d))*")
+_CURRENCY_PATTERN = re.compile(
+    r"(?<![^\W\d_])(?:" + "|".join(sorted((re.escape(key) for key in CURRENCY_CODES), key=len, reverse=True)) + r")(?![^\W\d_])",
+    re.IGNORECASE
+)
+# Applied right after the number, so "10 000 PLN / 3 m-ce" is not read as 10 000 million
+_MULTIPLIER_PATTERN = re.compile(
+    r"\s*(" + "|".join(sorted((re.escape(key) for key in AMOUNT_MULTIPLIERS), key=len, reverse=True)) + r")(?![a-ząćęłńóśźż-])",
+    re.IGNORECASE
+)
+# A second number right after the first: "20-30 tys." is a range, "5, 10 or 15" a list of alternatives
+_RANGE_PATTERN = re.compile(r"\s*(?:[-\u2013\u2014]|to\b|do\b)\s*(\d+(?:[.,']\d+|\s\d{3}(?!\d))*)", re.IGNORECASE)
+_ALTERNATIVES_PATTERN = re.compile(
+    r"(?:\s*,\s*\d+(?:[.,']\d+)*)*,?\s*(?:or\b|and\b|lub\b|albo\b|i\b)\s*\d", re.IGNORECASE
+)
+_PERCENT_PATTERN = re.compile(r"(\d+(?:[.,]\d+)?)\s*%?")
+_POSTAL_CODE_PATTERN = re.compile(r"(?<!\d)(\d{2})-(\d{3})(?!\d)")
+_CITY_AFTER_POSTAL_PATTERN = re.compile(r"\d{2}-\d{3}[,\s]+([^\W\d_][^\n,\d]*)")
+_VOIVODESHIP_PATTERN = re.compile(
+    r"(?<![\w-])(" + "|".join(sorted(VOIVODESHIPS, key=len, reverse=True)) + r")(?![\w-])"
+)
+_ISO_DATE_PATTERN = re.compile(r"(?<!\d)(\d{4})-(\d{1,2})-(\d{1,2})(?!\d)")
+_DMY_DATE_PATTERN = re.compile(r"(?<!\d)(\d{1,2})[./](\d{1,2})[./](\d{4})(?!\d)")
+_TEXT_DATE_PATTERN = re.compile(r"(?<!\d)(\d{1,2})\.?\s+([a-z]+)\.?\s+(\d{4})(?!\d)")
+_TEXT_DATE_EN_PATTERN = re.compile(r"\b([a-z]+)\.?\s+(\d{1,2}),?\s+(\d{4})(?!\d)")
+_QUARTER_PATTERN = re.compile(
+    r"\b(?:q([1-4])|quarter\s+([1-4])|([1-4])\s*(?:kw\.|kwartal)|"
+    r"(i{1,3}|iv)\s*(?:kw\.|kwartal))[\s\-/]*((?:19|20)\d\d)\b"
+)
+_MONTH_YEAR_PATTERN = re.compile(r"\b([a-z]+)\s+((?:19|20)\d\d)\b")
+
+
+def _fold(text: str) -> str:
+    """Lowercase text and strip Polish diacritics."""
+    return unicodedata.normalize("NFC", text).translate(_ASCII_FOLD).lower()
+
+
+def _parse_number(token: str) -> Optional[float]:
+    """Parse a number written with PL or EN grouping and decimal separators."""
+    token = token.strip().replace(" ", "").replace("\u00a0", "").replace("'", "").rstrip(".,")
+    if not token:
+        return None
+
+    if "," in token and "." in token:
+        # Whichever separator comes last is the decimal separator
+        if token.rfind(",") > token.rfind("."):
+            token = token.replace(".", "").replace(",", ".")
+        else:
+            token = token.replace(",", "")
+    elif "," in token:
+        head, _, tail = token.rpartition(",")
+        if token.count(",") == 1 and len(tail) != 3:
+            token = head + "." + tail
+        else:
+            token = token.replace(",", "")
+    elif token.count(".") > 1 or (token.count(".") == 1 and len(token.rpartition(".")[2]) == 3):
+        token = token.replace(".", "")
+
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=65536)
+def parse_amount(text: str) -> Tuple[Optional[float], Optional[str]]:
+    """
+    Parse a monetary amount such as "12 500,00 zł", "$75,000" or "1,2 mln PLN".
+
+    For a range such as "20-30 tys. zł" the lower bound is returned, with the
+    multiplier after the range applied to it. A list of alternatives such as
+    "5, 10 or 15 thousand" has no single value, so no value is returned for it.
+
+    Args:
+        text: Free-text amount
+
+    Returns:
+        Tuple of the numeric value and the ISO 4217 currency code (either may be None)
+    """
+    number_match = _NUMBER_PATTERN.search(text)
+    value = _parse_number(number_match.group(0)) if number_match else None
+
+    if value is not None:
+        end = number_match.end()
+        range_match = _RANGE_PATTERN.match(text, end)
+        if range_match:
+            end = range_match.end()
+        elif _ALTERNATIVES_PATTERN.match(text, end):
+            return None, parse_currency(text)
+
+        multiplier_match = _MULTIPLIER_PATTERN.match(text, end)
+        if multiplier_match:
+            value *= AMOUNT_MULTIPLIERS[multiplier_match.group(1).lower()]
+
+    return value, parse_currency(text)
+
+
+@lru_cache(maxsize=4096)
+def parse_currency(text: str) -> Optional[str]:
+    """
+    Map a currency symbol, word or code to its ISO 4217 code.
+
+    Args:
+        text: Text containing a currency
+
+    Returns:
+        ISO 4217 code, or None if no known currency was found
+    """
+    match = _CURRENCY_PATTERN.search(text)
+    if match:
+        return CURRENCY_CODES[match.group(0).lower()]
+    code = text.strip().upper()
+    return code if code in ISO_CURRENCY_CODES else None
+
+
+@lru_cache(maxsize=4096)
+def parse_probability(text: str) -> Optional[float]:
+    """
+    Parse a probability such as "65%", "0,65" or "65" into a percentage.
+
+    Args:
+        text: Free-text probability
+
+    Returns:
+        Probability between 0 and 100, or None if it could not be parsed
+    """
+    match = _PERCENT_PATTERN.search(text)
+    if not match:
+        return None
+    value = float(match.group(1).replace(",", "."))
+    if value <= 1 and "%" not in text:
+        value *= 100
+    return value if 0 <= value <= 100 else None
+
+
+@lru_cache(maxsize=65536)
+def normalize_phone(text: str) -> Optional[str]:
+    """
+    Convert a phone number to E.164 format.
+
+    Only numbers whose country is certain are converted: those written with a
+    "+" or "00" country code, and 9-digit numbers without a trunk 0, which
+    are Polish. Anything else (e.g. "022 123 45 67") is left to the caller.
+
+    Args:
+        text: Phone number as written in the document
+
+    Returns:
+        Phone number in E.164 format, or None if it does not look like a phone number
+    """
+    stripped = text.strip()
+    digits = re.sub(r"\D", "", stripped)
+
+    if stripped.startswith("+"):
+        pass
+    elif stripped.startswith("00"):
+        digits = digits[2:]
+    elif len(digits) == NATIONAL_NUMBER_LENGTH and not digits.startswith("0"):
+        digits = NATIONAL_COUNTRY_CODE + digits
+    elif len(digits) == len(NATIONAL_COUNTRY_CODE) + NATIONAL_NUMBER_LENGTH and digits.startswith(NATIONAL_COUNTRY_CODE):
+        pass
+    else:
+        return None
+
+    if not 8 <= len(digits) <= 15:
+        return None
+    return "+" + digits
+
+
+@lru_cache(maxsize=65536)
+def normalize_date(text: str) -> Optional[str]:
+    """
+    Convert a date or quarter to ISO format.
+
+    Recognises "2025-06-30", "30.06.2025", "30 czerwca 2025", "June 30, 2025",
+    "Q3 2023", "III kwartał 2025" and "czerwiec 2025".
+
+    Args:
+        text: Free-text date or timeline
+
+    Returns:
+        "YYYY-MM-DD", "YYYY-MM" or "YYYY-Qn", or None if no date was found
+    """
+    folded = _fold(text)
+
+    match = _ISO_DATE_PATTERN.search(folded)
+    if match:
+        return _format_date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+
+    match = _DMY_DATE_PATTERN.search(folded)
+    if match:
+        return _format_date(int(match.group(3)), int(match.group(2)), int(match.group(1)))
+
+    match = _TEXT_DATE_PATTERN.search(folded)
+    if match and match.group(2) in MONTHS:
+        return _format_date(int(match.group(3)), MONTHS[match.group(2)], int(match.group(1)))
+
+    match = _TEXT_DATE_EN_PATTERN.search(folded)
+    if match and match.group(1) in MONTHS:
+        return _format_date(int(match.group(3)), MONTHS[match.group(1)], int(match.group(2)))
+
+    match = _QUARTER_PATTERN.search(folded)
+    if match:
+        arabic = match.group(1) or match.group(2) or match.group(3)
+        quarter = int(arabic) if arabic else ROMAN_QUARTERS[match.group(4)]
+        return f"{match.group(5)}-Q{quarter}"
+
+    for match in _MONTH_YEAR_PATTERN.finditer(folded):
+        if match.group(1) in MONTHS:
+            return f"{match.group(2)}-{MONTHS[match.group(1)]:02d}"
+
+    return None
+
+
+def _format_date(year: int, month: int, day: int) -> Optional[str]:
+    """Format a date as YYYY-MM-DD if it is plausible."""
+    if 1 <= month <= 12 and 1 <= day <= 31:
+        return f"{year:04d}-{month:02d}-{day:02d}"
+    return None
+
+
+@lru_cache(maxsize=65536)
+def parse_address(text: str) -> Dict[str, Optional[str]]:
+    """
+    Parse voivodeship, postal code and city from a Polish address.
+
+    Args:
+        text: Address or location text
+
+    Returns:
+        Dictionary with "voivodeship", "postal_code" and "city" keys (values may be None)
+    """
+    voivodeship = None
+    match = _VOIVODESHIP_PATTERN.search(_fold(text))
+    if match:
+        voivodeship = VOIVODESHIPS[match.group(1)]
+
+    postal_code = None
+    city = None
+    match = _POSTAL_CODE_PATTERN.search(text)
+    if match:
+        postal_code = f"{match.group(1)}-{match.group(2)}"
+        city_match = _CITY_AFTER_POSTAL_PATTERN.search(text, match.start())
+        if city_match:
+            city = city_match.group(1).strip() or None
+
+    return {"voivodeship": voivodeship, "postal_code": postal_code, "city": city}
+
+
+def _column(results: List[BaseModel], field: str) -> List:
+    """Return one field's values across a batch."""
+    return [getattr(result, field, None) for result in results]
+
+
+def _map_unique(values: List, parser) -> Dict:
+    """Parse each distinct non-empty string value once."""
+    return {value: parser(value) for value in set(values) if isinstance(value, str) and value.strip()}
+
+
+def normalize_batch(results: List[BaseModel]) -> List[BaseModel]:
+    """
+    Normalize a batch of extraction results.
+
+    Converts currencies to ISO 4217 codes, derives contact_phone_e164 from the
+    phone number and timeline_iso from the timeline, and splits the location
+    into voivodeship, postal_code and city. The original values are kept. Probabilities are already scaled to percentages by
+    parse_probability when they are extracted, so they are left as they are.
+
+    Args:
+        results: CRMOpportunity objects to normalize
+
+    Returns:
+        New CRMOpportunity objects with normalized values (None entries are kept as is)
+    """
+    present = [result for result in results if result is not None]
+    if not present:
+        return list(results)
+
+    phones = _column(present, "contact_phone")
+    currencies = _column(present, "currency")
+    timelines = _column(present, "timeline")
+    locations = _column(present, "location")
+
+    phone_map = _map_unique(phones, normalize_phone)
+    currency_map = _map_unique(currencies, parse_currency)
+    timeline_map = _map_unique(timelines, normalize_date)
+    address_map = _map_unique(locations, parse_address)
+
+    normalized = {}
+    for result, phone, currency, timeline, location in zip(present, phones, currencies, timelines, locations):
+        update = {}
+
+        if phone in phone_map and not result.contact_phone_e164:
+            update["contact_phone_e164"] = phone_map[phone]
+        if currency in currency_map and currency_map[currency]:
+            update["currency"] = currency_map[currency]
+        if timeline in timeline_map and not result.timeline_iso:
+            update["timeline_iso"] = timeline_map[timeline]
+
+        if location in address_map:
+            for key, value in address_map[location].items():
+                if value and not getattr(result, key, None):
+                    update[key] = value
+
+        normalized[id(result)] = result.model_copy(update=update) if update else result
+
+    return [normalized[id(result)] if result is not None else None for result in results]
+
+
+def benchmark(record_count: int = 10000) -> Dict[str, float]:
+    """
+    Time normalize_batch over synthetic records.
+
+    Args:
+        record_count: Number of records to normalize
+
+    Returns:
+        Dictionary with total seconds and microseconds per record
+    """
+    from .extractor import CRMOpportunity
+
+    phones = ["+48 123 456 789", "+1 (555) 123-4567", "0048 600-700-800", "601 234 567", "022 123 45 67"]
+    timelines = ["do 30 czerwca 2025", "Q3 2023", "III kwartał 2025", "2025-06-30", "do końca kwartału"]
+    locations = [
+        "Mazowieckie, powiat warszawski, 00-001, Warszawa",
+        "Śląskie, powiat gliwicki, 44-100, Gliwice",
+        "Malopolskie, pow. krakowski, 30-001, Kraków",
+    ]
+    records = [
+        CRMOpportunity(
+            company_name=f"Company {i}",
+            contact_phone=phones[i % len(phones)] if i % 7 else f"+48 600 {i % 1000:03d} {i % 997:03d}",
+            currency=["zł", "USD", "€"][i % 3],
+            timeline=timelines[i % len(timelines)],
+            location=locations[i % len(locations)],
+            probability=(i % 100) / 100,
+        )
+        for i in range(record_count)
+    ]
+
+    start = time.perf_counter()
+    normalize_batch(records)
+    elapsed = time.perf_counter() - start
+
+    return {"seconds": elapsed, "us_per_record": elapsed / record_count * 1e6}
+
+
+# Inputs with known parses, checked alongside the benchmark
+PARSER_CASES = [
+    (parse_amount, "12 500,00 zł", (12500.0, "PLN")),
+    (parse_amount, "$75,000", (75000.0, "USD")),
+    (parse_amount, "1,2 mln PLN", (1200000.0, "PLN")),
+    (parse_amount, "1.234.567,89 EUR", (1234567.89, "EUR")),
+    (parse_amount, "10 000 PLN / 3 m-ce", (10000.0, "PLN")),
+    (parse_amount, "Budżet ok. 20-30 tys. zł", (20000.0, "PLN")),
+    (parse_amount, "od 20 do 30 tys. zł", (20000.0, "PLN")),
+    (parse_amount, "20 000 - 30 000 zł", (20000.0, "PLN")),
+    (parse_amount, "5, 10 or 15 thousand", (None, None)),
+    (parse_amount, "5 lub 10 tys. zł", (None, "PLN")),
+    (parse_amount, "$75,000, 30 days", (75000.0, "USD")),
+    (parse_amount, "10 000/3 m-ce", (10000.0, None)),
+    (normalize_phone, "+48 123 456 789", "+48123456789"),
+    (normalize_phone, "0048 600-700-800", "+48600700800"),
+    (normalize_phone, "601 234 567", "+48601234567"),
+    (normalize_phone, "+1 (555) 123-4567", "+15551234567"),
+    (normalize_phone, "022 123 45 67", None),
+    (normalize_phone, "(555) 123-4567", None),
+    (normalize_date, "III kwartał 2025", "2025-Q3"),
+    (normalize_date, "do 30 czerwca 2025", "2025-06-30"),
+]
+
+
+def check_parsers() -> List[str]:
+    """
+    Run the parsers over PARSER_CASES.
+
+    Returns:
+        Descriptions of the cases that parsed differently than expected (empty if all passed)
+    """
+    failures = []
+    for parser, text, expected in PARSER_CASES:
+        actual = parser(text)
+        if actual != expected:
+            failures.append(f"{parser.__name__}({text!r}) = {actual!r}, expected {expected!r}")
+    return failures
+
+
+if __name__ == "__main__":
+    import sys
+
+    stats = benchmark()
+    print(f"Normalized 10000 records in {stats['seconds']:.3f}s ({stats['us_per_record']:.1f} us/record)")
+
+    failures = check_parsers()
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"OK: {len(PARSER_CASES)} parser cases")
@@ -0,0 +1,318 @@
+"""
+Profiling Module
+
+This module provides an opt-in profiler for single extractions. While active it
+samples the call stacks of the threads working on the extraction, records timed
+phases (rules, inference, validation, ...) and per-pattern regex timings, and
+writes everything to a speedscope file (https://www.speedscope.app) per request.
+
+Sampling runs on a background thread at a fixed interval, and regex timing only
+happens while a profiler is active, so the profiler can be left enabled for a
+small fraction of production traffic (see PROFILE_SAMPLE_RATE).
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import datetime
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import List, Optional
+
+_current = contextvars.ContextVar("crm_extraction_profiler", default=None)
+
+
+def current_profiler() -> Optional["ExtractionProfiler"]:
+    """Return the profiler active in the current context, if any."""
+    return _current.get()
+
+
+def should_profile() -> bool:
+    """
+    Decide whether to profile a request based on the environment.
+
+    PROFILE_EXTRACTION=1 profiles every request; otherwise a PROFILE_SAMPLE_RATE
+    fraction (0-1) of requests is profiled.
+    """
+    if os.getenv("PROFILE_EXTRACTION", "").lower() in ("1", "true", "yes"):
+        return True
+    rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0") or 0)
+    return rate > 0 and random.random() < rate
+
+
+def client_may_request_profile(address: Optional[str]) -> bool:
+    """
+    Decide whether a client may ask for a profile of its own request.
+
+    Only addresses listed in PROFILE_ALLOWED_CLIENTS (comma-separated, default
+    loopback only) may; an empty list disables profiling on request.
+    """
+    allowed = os.getenv("PROFILE_ALLOWED_CLIENTS", "127.0.0.1,::1")
+    return address in {client.strip() for client in allowed.split(",") if client.strip()}
+
+
+def rotate_profiles(directory: str, keep: Optional[int] = None):
+    """
+    Delete the oldest profiles in a directory, keeping the newest ones.
+
+    Args:
+        directory: Profile directory
+        keep: Number of profiles to keep (defaults to PROFILE_MAX_FILES or 100; 0 keeps all)
+    """
+    if keep is None:
+        keep = int(os.getenv("PROFILE_MAX_FILES", "100"))
+    if keep <= 0:
+        return
+
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith(".speedscope.json")]
+    except OSError as e:
+        print(f"Error listing profiles in {directory}: {str(e)}")
+        return
+    if len(names) <= keep:
+        return
+
+    # Other requests may be rotating the same directory, so files can vanish while it is scanned
+    profiles = []
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            profiles.append((os.path.getmtime(path), path))
+        except OSError:
+            continue
+    profiles.sort()
+    for _, path in profiles[:-keep]:
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Error removing old profile {path}: {str(e)}")
+
+
+@contextmanager
+def phase(name: str):
+    """Mark a named phase of the extraction for the active profiler (no-op otherwise)."""
+    profiler = _current.get()
+    if profiler is None:
+        yield
+        return
+
+    profiler.open_event(name)
+    try:
+        yield
+    finally:
+        profiler.close_event(name)
+
+
+class ExtractionProfiler:
+    """Sampling profiler for a single extraction request."""
+
+    def __init__(self, name: str, interval: Optional[float] = None):
+        """
+        Initialize the profiler.
+
+        Args:
+            name: Name of the profiled request, used in the output file
+            interval: Seconds between stack samples (defaults to PROFILE_INTERVAL_MS or 5ms)
+        """
+        if interval is None:
+            interval = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+
+        self.name = name
+        self.interval = interval
+        self.pattern_timings = {}
+        self.phase_timings = {}
+
+        self._frames = []
+        self._frame_index = {}
+        self._samples = {}
+        self._events = {}
+        self._open = {}
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._token = None
+        self._start = None
+        self._end = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._token = _current.set(self)
+        self.attach_thread()
+        self._sampler = threading.Thread(target=self._sample_loop, name="crm-profiler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._sampler.join()
+        self._end = time.perf_counter()
+        _current.reset(self._token)
+        return False
+
+    def attach_thread(self):
+        """Include the calling thread in stack sampling."""
+        thread = threading.current_thread()
+        with self._lock:
+            self._threads[thread.ident] = thread.name
+
+    def record_pattern(self, pattern: str, start: float, end: float):
+        """Record one regex search."""
+        key = f"re: {pattern}"
+        self._add_event(key, "regex", start, end)
+        with self._lock:
+            stats = self.pattern_timings.setdefault(pattern, {"calls": 0, "total": 0.0, "max": 0.0})
+            stats["calls"] += 1
+            stats["total"] += end - start
+            stats["max"] = max(stats["max"], end - start)
+
+    def open_event(self, name: str):
+        """Open a phase on the calling thread."""
+        ident = threading.get_ident()
+        frame = self._frame(name, "phase")
+        now = time.perf_counter()
+        with self._lock:
+            self._events.setdefault(ident, []).append({"type": "O", "frame": frame, "at": now - self._start})
+            self._open.setdefault(ident, []).append((name, now))
+
+    def close_event(self, name: str):
+        """Close the innermost phase on the calling thread."""
+        ident = threading.get_ident()
+        frame = self._frame(name, "phase")
+        now = time.perf_counter()
+        with self._lock:
+            self._events.setdefault(ident, []).append({"type": "C", "frame": frame, "at": now - self._start})
+            _, started = self._open[ident].pop()
+            self.phase_timings[name] = self.phase_timings.get(name, 0.0) + now - started
+
+    def summary(self, top: int = 5) -> dict:
+        """
+        Summarize phase totals and the slowest regex patterns.
+
+        Args:
+            top: Number of patterns to include
+
+        Returns:
+            Dictionary with "duration", "phases" and "patterns" keys
+        """
+        patterns = sorted(self.pattern_timings.items(), key=lambda item: item[1]["total"], reverse=True)
+        return {
+            "duration": (self._end or time.perf_counter()) - self._start,
+            "phases": dict(self.phase_timings),
+            "patterns": [{"pattern": pattern, **stats} for pattern, stats in patterns[:top]],
+        }
+
+    def to_speedscope(self) -> dict:
+        """Return the profile in speedscope's file format."""
+        end = (self._end or time.perf_counter()) - self._start
+        profiles = []
+
+        for ident, samples in self._samples.items():
+            profiles.append({
+                "type": "sampled",
+                "name": f"{self._threads.get(ident, ident)} (samples)",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": end,
+                "samples": [stack for stack, _ in samples],
+                "weights": [weight for _, weight in samples],
+            })
+
+        for ident, events in self._events.items():
+            profiles.append({
+                "type": "evented",
+                "name": f"{self._threads.get(ident, ident)} (phases and regex)",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": end,
+                "events": events,
+            })
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "crm_extractor.profiling",
+            "activeProfileIndex": 0,
+            "shared": {"frames": self._frames},
+            "profiles": profiles,
+        }
+
+    def save(self, directory: Optional[str] = None) -> str:
+        """
+        Write the profile to a speedscope file, removing the oldest profiles
+        beyond PROFILE_MAX_FILES.
+
+        Args:
+            directory: Output directory (defaults to PROFILE_DIR or "profiles")
+
+        Returns:
+            Path of the written file
+        """
+        directory = directory or os.getenv("PROFILE_DIR", "profiles")
+        os.makedirs(directory, exist_ok=True)
+
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        safe_name = re.sub(r"[^\w.-]+", "_", self.name)
+        path = os.path.join(directory, f"{safe_name}_{timestamp}.speedscope.json")
+        with open(path, "w") as f:
+            json.dump(self.to_speedscope(), f)
+        rotate_profiles(directory)
+        return path
+
+    def _add_event(self, name: str, file: str, start: float, end: float):
+        """Append a completed open/close event pair on the calling thread."""
+        ident = threading.get_ident()
+        frame = self._frame(name, file)
+        with self._lock:
+            events = self._events.setdefault(ident, [])
+            events.append({"type": "O", "frame": frame, "at": start - self._start})
+            events.append({"type": "C", "frame": frame, "at": end - self._start})
+
+    def _frame(self, name: str, file: str, line: Optional[int] = None) -> int:
+        """Return the index of a frame in the shared frame table, adding it if needed."""
+        key = (name, file, line)
+        index = self._frame_index.get(key)
+        if index is None:
+            with self._lock:
+                index = self._frame_index.get(key)
+                if index is None:
+                    index = len(self._frames)
+                    frame = {"name": name, "file": file}
+                    if line is not None:
+                        frame["line"] = line
+                    self._frames.append(frame)
+                    self._frame_index[key] = index
+        return index
+
+    def _sample_loop(self):
+        """Sample the stacks of attached threads until stopped."""
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight = now - last
+            last = now
+
+            frames = sys._current_frames()
+            with self._lock:
+                idents = list(self._threads)
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = self._stack(frame)
+                with self._lock:
+                    self._samples.setdefault(ident, []).append((stack, weight))
+
+    def _stack(self, frame) -> List[int]:
+        """Convert a frame chain into frame indices ordered from root to leaf."""
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(self._frame(code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
@@ -0,0 +1,324 @@
+"""
+Regex Guard Module
+
+This module bounds the work the rule-based extractor does on arbitrary pasted
+text. Each document gets an input-size limit and a time budget, and every pattern
+is applied only to bounded windows of the text: around occurrences of the
+pattern's literal label ("Firma:", "Notes", ...) where it has one, or to
+overlapping fixed-size chunks otherwise. Since no single regex call ever sees
+more than one window, a pathological pattern can cost at most a constant per
+window, keeping the total runtime linear in the input size.
+
+When the time budget runs out, remaining searches report no match, so the rule
+engine returns whatever it found so far and the router can escalate to a model.
+
+Run the fuzz/scaling check with:
+    python -m src.crm_extractor.regex_guard
+It exits with an error if runtime grows faster than linearly with the input size.
+"""
+
+import os
+import re
+import sys
+import math
+import time
+import random
+from functools import lru_cache
+from typing import Optional
+
+from .profiling import current_profiler
+
+# Characters that end a pattern's literal prefix
+_METACHARACTERS = set("\\.^$*+?{}[]|()")
+
+# Matches shorter than this are never split between chunks
+CHUNK_OVERLAP = 512
+
+# Largest allowed growth in runtime when the input size doubles (linear is 2, quadratic 4)
+MAX_GROWTH_RATIO = 3.0
+
+
+@lru_cache(maxsize=1024)
+def _compile(pattern: str, flags: int):
+    """Compile and cache a pattern."""
+    return re.compile(pattern, flags)
+
+
+@lru_cache(maxsize=1024)
+def literal_prefix(pattern: str) -> str:
+    """
+    Return the literal text every match of a pattern must start with.
+
+    Args:
+        pattern: Regular expression
+
+    Returns:
+        The literal prefix, or an empty string if the pattern has none
+    """
+    # A top-level alternation means matches may start with different text
+    depth = 0
+    escaped = False
+    for char in pattern:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return ""
+
+    prefix = []
+    for char in pattern:
+        if char in _METACHARACTERS:
+            # A quantifier makes the preceding character optional
+            if char in "?*{" and prefix:
+                prefix.pop()
+            break
+        prefix.append(char)
+    return "".join(prefix)
+
+
+class RuleBudget:
+    """Per-document limits for the rule-based extractor."""
+
+    def __init__(self, time_budget: Optional[float] = None, max_input_chars: Optional[int] = None,
+                 window: int = 4000):
+        """
+        Initialize the budget.
+
+        Args:
+            time_budget: Seconds the rule engine may spend on the document (None for no limit)
+            max_input_chars: Characters of input scanned (None for no limit)
+            window: Characters scanned per label hit or chunk
+        """
+        self.time_budget = time_budget
+        self.max_input_chars = max_input_chars
+        self.window = max(window, CHUNK_OVERLAP * 2)
+        self.deadline = time.perf_counter() + time_budget if time_budget else None
+        self.exhausted = False
+        self.truncated = False
+
+    @classmethod
+    def from_env(cls) -> "RuleBudget":
+        """
+        Create a budget from RULES_TIME_BUDGET_MS, RULES_MAX_INPUT_CHARS and RULES_SCAN_WINDOW.
+        """
+        time_budget_ms = float(os.getenv("RULES_TIME_BUDGET_MS", "500"))
+        max_input_chars = int(os.getenv("RULES_MAX_INPUT_CHARS", "200000"))
+        return cls(
+            time_budget=time_budget_ms / 1000 if time_budget_ms > 0 else None,
+            max_input_chars=max_input_chars if max_input_chars > 0 else None,
+            window=int(os.getenv("RULES_SCAN_WINDOW", "4000"))
+        )
+
+    def limit_input(self, text: str) -> str:
+        """
+        Truncate the text to the input-size budget.
+
+        Args:
+            text: Document text
+
+        Returns:
+            The text, cut to at most max_input_chars characters
+        """
+        if self.max_input_chars is not None and len(text) > self.max_input_chars:
+            print(f"Rule-based extraction limited to the first {self.max_input_chars} of {len(text)} characters")
+            self.truncated = True
+            return text[:self.max_input_chars]
+        return text
+
+    def expired(self) -> bool:
+        """Return True once the time budget has run out."""
+        if not self.exhausted and self.deadline is not None and time.perf_counter() > self.deadline:
+            print(f"Rule-based extraction time budget of {self.time_budget:.3f}s exhausted, skipping remaining patterns")
+            self.exhausted = True
+        return self.exhausted
+
+    def search(self, pattern: str, text: str, flags: int = 0):
+        """
+        Find the leftmost match of a pattern, scanning only bounded windows of the text.
+
+        Args:
+            pattern: Regular expression
+            text: Text to search
+            flags: Regular expression flags
+
+        Returns:
+            The match object, or None if there is no match or the budget is exhausted
+        """
+        if self.expired():
+            return None
+
+        profiler = current_profiler()
+        start = time.perf_counter() if profiler is not None else None
+
+        prefix = literal_prefix(pattern)
+        if len(prefix) >= 3:
+            match = self._search_labels(pattern, prefix, text, flags)
+        else:
+            match = self._search_chunks(pattern, text, flags)
+
+        if profiler is not None:
+            profiler.record_pattern(pattern, start, time.perf_counter())
+        return match
+
+    def _search_labels(self, pattern: str, prefix: str, text: str, flags: int):
+        """Try the pattern at each occurrence of its literal prefix."""
+        compiled = _compile(pattern, flags)
+        label = _compile(re.escape(prefix), flags & re.IGNORECASE)
+
+        # A labelled value is capped at one window, like a truncated field
+        for hit in label.finditer(text):
+            match = compiled.match(text, hit.start(), min(len(text), hit.start() + self.window))
+            if match:
+                return match
+            if self.expired():
+                return None
+        return None
+
+    def _search_chunks(self, pattern: str, text: str, flags: int):
+        """Search overlapping fixed-size chunks from left to right."""
+        compiled = _compile(pattern, flags)
+        step = self.window - CHUNK_OVERLAP
+
+        for chunk_start in range(0, max(len(text), 1), step):
+            chunk_end = min(len(text), chunk_start + self.window)
+            # Matches starting at or after next_start are found by the next chunk
+            next_start = chunk_start + step
+            match = None
+            position = chunk_start
+            while position < next_start:
+                candidate = compiled.search(text, position, chunk_end)
+                if candidate is None or (candidate.start() >= next_start and chunk_end < len(text)):
+                    break
+                if _complete(candidate, chunk_end, text):
+                    match = candidate
+                    break
+                # The match ran into the chunk edge, where lookaheads and `$` see a false end of
+                # text; re-match with a full window and otherwise keep scanning after its start
+                endpos = min(len(text), candidate.start() + self.window)
+                rematch = compiled.match(text, candidate.start(), endpos)
+                if rematch and _complete(rematch, endpos, text):
+                    match = rematch
+                    break
+                position = candidate.start() + 1
+                if self.expired():
+                    return None
+            if match:
+                return match
+            if chunk_end == len(text) or self.expired():
+                return None
+        return None
+
+
+def _complete(match, endpos: int, text: str) -> bool:
+    """Return False if a match reaches a search limit that is not the end of the text."""
+    return match.end() < endpos or endpos == len(text)
+
+
+def _fuzz_text(size: int, seed: int) -> str:
+    """Generate adversarial text mixing labels, long runs and separators."""
+    rng = random.Random(seed)
+    fragments = [
+        "Notes: ", "Integracje: ", "Phone: ", "tel: ", "Firma: ", "Company Name: ",
+        "Mazowieckie, powiat ", "Śląskie, p. ", "@", "a" * 200, "1 " * 100, "-" * 50,
+        "+48 ", "(555) ", "\n", "\n\n", "Termin realizacji: ", "Q3 20", "x" * 500 + "@",
+    ]
+    parts = []
+    length = 0
+    while length < size:
+        fragment = rng.choice(fragments)
+        parts.append(fragment)
+        length += len(fragment)
+    return "".join(parts)[:size]
+
+
+def benchmark(sizes=(25000, 50000, 100000, 200000), seeds: int = 3) -> dict:
+    """
+    Time the per-document regex work on adversarial inputs of increasing size.
+
+    Each input goes through the router's document profiling and the rule engine,
+    the two passes every document gets before any model runs. Budgets are disabled
+    so the measurement reflects the scanning strategy alone.
+
+    Args:
+        sizes: Input sizes in characters
+        seeds: Number of random inputs per size (the slowest is reported)
+
+    Returns:
+        Mapping of size to the worst time in seconds
+    """
+    from .extractor import CRMDataExtractor
+    from .router import BackendRouter
+
+    extractor = CRMDataExtractor.__new__(CRMDataExtractor)
+    router = BackendRouter(log_path="")
+    adversarial = [
+        lambda size, seed: "a" * size,
+        lambda size, seed: "\n" * size,
+        lambda size, seed: (" \n" * (size // 2 + 1))[:size],
+        lambda size, seed: ("Notes:" * (size // 6 + 1))[:size],
+        lambda size, seed: ("Phone: " + "1 " * (size // 2))[:size],
+        lambda size, seed: ("tel: " + "1234567890" * (size // 10 + 1))[:size],
+        lambda size, seed: ("Mazowieckie, powiat " + "a" * size)[:size],
+        _fuzz_text,
+    ]
+
+    timings = {}
+    for size in sizes:
+        worst = 0.0
+        for generate in adversarial:
+            for seed in range(seeds):
+                text = generate(size, seed)
+                start = time.perf_counter()
+                router.profile(text)
+                extractor._run_rules(text, RuleBudget(time_budget=None, max_input_chars=None))
+                worst = max(worst, time.perf_counter() - start)
+        timings[size] = worst
+    return timings
+
+
+def check_linear(timings: dict, max_growth: float = MAX_GROWTH_RATIO) -> list:
+    """
+    Compare runtimes between successive input sizes against linear growth.
+
+    Args:
+        timings: Mapping of size to seconds, as returned by benchmark()
+        max_growth: Largest allowed runtime ratio per doubling of the input size
+
+    Returns:
+        Descriptions of the size steps that grew too fast (empty if runtime is linear)
+    """
+    failures = []
+    sizes = sorted(timings)
+    for smaller, larger in zip(sizes, sizes[1:]):
+        # Scale the allowance to the actual size ratio (max_growth per doubling)
+        allowed = max_growth ** max(math.log2(larger / smaller), 1)
+        ratio = timings[larger] / max(timings[smaller], 1e-6)
+        if ratio > allowed:
+            failures.append(f"{smaller} -> {larger} chars: runtime grew x{ratio:.2f} (allowed x{allowed:.2f})")
+    return failures
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = benchmark()
+
+    previous = None
+    for size, seconds in results.items():
+        growth = f" (x{seconds / previous:.2f} for x2 input)" if previous else ""
+        print(f"{size:>8} chars: worst {seconds * 1000:.1f} ms, {seconds / size * 1e6:.2f} us/char{growth}")
+        previous = seconds
+
+    failures = check_linear(results)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK: runtime grows linearly with input size")
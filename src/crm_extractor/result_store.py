@@ -0,0 +1,268 @@
+"""
+Result Store Module
+
+This module keeps batch extraction results in a SQLite database so large batches
+can be browsed a page at a time, single results fetched by id within their batch,
+and whole batches exported without loading every result into memory (or into the
+rendered page).
+
+Each result row holds a short summary (filename, company name, error) used for
+listing pages, plus the full extracted data as JSON, which is only read when a
+single result or an export is requested.
+"""
+
+import os
+import io
+import csv
+import json
+import uuid
+import sqlite3
+import datetime
+from contextlib import closing
+from typing import Iterator, List, Optional, Tuple
+
+from .extractor import CRMOpportunity
+
+# Column order for CSV exports
+EXPORT_FIELDS = ["id", "filename", "error"] + list(CRMOpportunity.model_fields)
+
+# Results fetched per query while streaming an export
+EXPORT_CHUNK_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    total INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT,
+    filename TEXT,
+    company_name TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS results_batch ON results (batch_id, id);
+"""
+
+
+class ResultStore:
+    """SQLite-backed store of extraction results."""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Open (and if needed create) the store.
+
+        Args:
+            path: Database file (defaults to RESULT_STORE_PATH or extraction_results/results.db)
+        """
+        self.path = path or os.getenv("RESULT_STORE_PATH", os.path.join("extraction_results", "results.db"))
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        with closing(self._connect()) as connection:
+            connection.executescript(_SCHEMA)
+
+    def create_batch(self, total: int) -> str:
+        """
+        Register a new batch.
+
+        Args:
+            total: Number of documents in the batch
+
+        Returns:
+            The batch id
+        """
+        batch_id = uuid.uuid4().hex
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT INTO batches (id, created_at, total) VALUES (?, ?, ?)",
+                (batch_id, _now(), total)
+            )
+        return batch_id
+
+    def get_batch(self, batch_id: str) -> Optional[dict]:
+        """
+        Look up a batch and how many of its documents have been processed.
+
+        Returns:
+            Dictionary with "id", "created_at", "total", "processed" and "errors", or None
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT id, created_at, total FROM batches WHERE id = ?", (batch_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            processed, errors = connection.execute(
+                "SELECT COUNT(*), COUNT(error) FROM results WHERE batch_id = ?", (batch_id,)
+            ).fetchone()
+        return {"id": row[0], "created_at": row[1], "total": row[2], "processed": processed, "errors": errors}
+
+    def add(self, data: Optional[dict], filename: str, batch_id: str,
+            error: Optional[str] = None) -> int:
+        """
+        Save one extraction result of a batch.
+
+        Args:
+            data: Extracted fields (None if the extraction failed)
+            filename: Name of the source document
+            batch_id: Batch the result belongs to
+            error: Error message if the extraction failed
+
+        Returns:
+            The result id
+        """
+        with closing(self._connect()) as connection, connection:
+            cursor = connection.execute(
+                "INSERT INTO results (batch_id, filename, company_name, error, created_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    batch_id,
+                    filename,
+                    (data or {}).get("company_name"),
+                    error,
+                    _now(),
+                    json.dumps(data, ensure_ascii=False) if data is not None else None,
+                )
+            )
+            return cursor.lastrowid
+
+    def page(self, batch_id: str, page: int = 1, per_page: int = 50) -> Tuple[List[dict], int]:
+        """
+        List one page of a batch's results without their full data.
+
+        Args:
+            batch_id: Batch id
+            page: Page number, starting at 1
+            per_page: Results per page
+
+        Returns:
+            Tuple of the result summaries and the total number of results in the batch
+        """
+        with closing(self._connect()) as connection:
+            (total,) = connection.execute(
+                "SELECT COUNT(*) FROM results WHERE batch_id = ?", (batch_id,)
+            ).fetchone()
+            rows = connection.execute(
+                "SELECT id, filename, company_name, error FROM results WHERE batch_id = ? "
+                "ORDER BY id LIMIT ? OFFSET ?",
+                (batch_id, per_page, (max(page, 1) - 1) * per_page)
+            ).fetchall()
+
+        summaries = [
+            {"id": row[0], "filename": row[1], "company_name": row[2], "error": row[3]}
+            for row in rows
+        ]
+        return summaries, total
+
+    def get(self, result_id: int, batch_id: str) -> Optional[dict]:
+        """
+        Fetch one result of a batch with its full data.
+
+        Args:
+            result_id: Result id
+            batch_id: Batch the result must belong to
+
+        Returns:
+            Dictionary with "id", "batch_id", "filename", "error" and the extracted fields, or None
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT id, batch_id, filename, error, data FROM results WHERE id = ? AND batch_id = ?",
+                (result_id, batch_id)
+            ).fetchone()
+        return _row_to_result(row) if row is not None else None
+
+    def iter_batch(self, batch_id: str) -> Iterator[dict]:
+        """
+        Iterate over all results of a batch with their full data, in chunks.
+
+        Args:
+            batch_id: Batch id
+
+        Yields:
+            Result dictionaries as returned by get()
+        """
+        last_id = 0
+        while True:
+            with closing(self._connect()) as connection:
+                rows = connection.execute(
+                    "SELECT id, batch_id, filename, error, data FROM results "
+                    "WHERE batch_id = ? AND id > ? ORDER BY id LIMIT ?",
+                    (batch_id, last_id, EXPORT_CHUNK_SIZE)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield _row_to_result(row)
+            last_id = rows[-1][0]
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection; one per call keeps the store safe to use from any thread."""
+        return sqlite3.connect(self.path, timeout=30)
+
+
+def _now() -> str:
+    """Return the current time as an ISO timestamp."""
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def _row_to_result(row) -> dict:
+    """Convert a results row into a result dictionary."""
+    result_id, batch_id, filename, error, data = row
+    result = {"id": result_id, "batch_id": batch_id, "filename": filename, "error": error}
+    if data:
+        result.update(json.loads(data))
+    return result
+
+
+def export_json(results: Iterator[dict]) -> Iterator[str]:
+    """
+    Serialize results as a JSON array, one result at a time.
+
+    Args:
+        results: Result dictionaries
+
+    Yields:
+        Chunks of the JSON document
+    """
+    yield "["
+    for index, result in enumerate(results):
+        yield ("," if index else "") + "\n" + json.dumps(result, ensure_ascii=False, indent=2)
+    yield "\n]\n"
+
+
+def export_csv(results: Iterator[dict]) -> Iterator[str]:
+    """
+    Serialize results as CSV with one row per result, one result at a time.
+
+    Args:
+        results: Result dictionaries
+
+    Yields:
+        Chunks of the CSV document
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writerow(EXPORT_FIELDS)
+    yield flush()
+    for result in results:
+        row = []
+        for field in EXPORT_FIELDS:
+            value = result.get(field)
+            if isinstance(value, list):
+                value = ", ".join(str(item) for item in value)
+            row.append("" if value is None else value)
+        writer.writerow(row)
+        yield flush()
@@ -0,0 +1,302 @@
+"""
+Backend Router Module
+
+This module decides which extraction backend handles a document, based on the
+structure of the document text and the caller's latency budget.
+"""
+
+import os
+import re
+import json
+import time
+import datetime
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field
+
+# Backends in order of increasing cost. Unknown backends are tried last.
+BACKEND_COSTS = {"rules": 0, "local": 1, "openai": 2}
+
+# Fields used to judge whether a backend filled the schema well enough
+COVERAGE_FIELDS = [
+    "company_name",
+    "contact_name",
+    "contact_email",
+    "contact_phone",
+    "timeline",
+    "notes",
+]
+
+# Roughly how much text fits in the local model's context window next to the prompt
+LOCAL_CONTEXT_CHARS = 3000
+
+# Line-leading labels recognised by the rule engine (English and Polish).
+# Leading whitespace is [ \t]* rather than \s* so a match cannot start on one line and
+# run across the following blank lines, which made profiling quadratic in the line count.
+LABEL_PATTERN = re.compile(
+    r"^[ \t]*(?:Company Name|Company|Organization|Client|Firma|Nazwa firmy|Klient|"
+    r"Contact Name|Contact|Person|Osoba kontaktowa|Kontakt(?:\s+do)?|e-mail|"
+    r"Phone|Tel(?:ephone)?|telefon|Zakres zlecenia|Projekt(?:\s+graficzny)?|"
+    r"Branża(?:\s+sklepu)?|Industry|Sector|(?:Orientacyjna\s+)?liczba\s+produktów|"
+    r"Number of products|Integracje|Integrations|Inne potrzeby Klienta|"
+    r"Other requirements|Timeline|Deadline|Termin realizacji(?:\s+usługi)?|"
+    r"Notes|Comments|Description|Details)\b",
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Polish diacritics and common words in Polish opportunity listings
+POLISH_MARKERS = re.compile(
+    r"[ąćęłńóśźżĄĆĘŁŃÓŚŹŻ]|\b(?:firma|zlecenia|zlecenie|termin|powiat|klient|kontakt)\b",
+    re.IGNORECASE
+)
+
+
+def field_coverage(opportunity: Optional[BaseModel], fields: Optional[List[str]] = None) -> float:
+    """
+    Compute the fraction of fields filled in an extraction result.
+
+    Args:
+        opportunity: Extraction result, or None if the backend found nothing
+        fields: Field names to check (defaults to COVERAGE_FIELDS)
+
+    Returns:
+        Value between 0.0 and 1.0
+    """
+    if opportunity is None:
+        return 0.0
+
+    fields = fields or COVERAGE_FIELDS
+    filled = 0
+    for name in fields:
+        value = getattr(opportunity, name, None)
+        if name == "company_name" and value in ("Unknown Company", "Example Company"):
+            continue
+        if value not in (None, "", []):
+            filled += 1
+
+    return filled / len(fields)
+
+
+class DocumentProfile(BaseModel):
+    """Structural features of a document used for routing."""
+
+    length: int = Field(description="Length of the document text in characters")
+    line_count: int = Field(description="Number of non-empty lines")
+    label_hits: int = Field(description="Number of lines starting with a known label")
+    label_density: float = Field(description="Label hits per non-empty line")
+    language: str = Field(description="Detected language code ('pl' or 'en')")
+
+
+class BackendAttempt(BaseModel):
+    """Outcome of running a single backend on a document."""
+
+    backend: str
+    elapsed: float = Field(description="Wall-clock time in seconds")
+    coverage: float = Field(0.0, description="Field coverage of the result")
+    error: Optional[str] = None
+
+
+class RoutingDecision(BaseModel):
+    """Record of how a document was routed, kept for later tuning."""
+
+    timestamp: str
+    profile: DocumentProfile
+    latency_budget: Optional[float] = None
+    plan: List[str] = Field(default_factory=list)
+    attempts: List[BackendAttempt] = Field(default_factory=list)
+    selected: Optional[str] = None
+    elapsed: float = 0.0
+
+
+class BackendRouter:
+    """Routes documents to the cheapest backend likely to fill the schema."""
+
+    def __init__(self, min_coverage: Optional[float] = None, log_path: Optional[str] = None):
+        """
+        Initialize the backend router.
+
+        Args:
+            min_coverage: Field coverage below which the router escalates to a heavier backend
+            log_path: JSONL file routing decisions are appended to (empty string disables)
+        """
+        if min_coverage is None:
+            min_coverage = float(os.getenv("ROUTER_MIN_COVERAGE", "0.5"))
+        if log_path is None:
+            log_path = os.getenv("ROUTING_LOG_PATH", os.path.join("logs", "routing_decisions.jsonl"))
+
+        self.min_coverage = min_coverage
+        self.min_label_density = 0.15
+        self.log_path = log_path
+        # Measured latencies only: a backend that has not run yet is not ruled out by a guess
+        self.latency_estimates = {}
+        self.coverage_estimates = {}
+        self.decisions = deque(maxlen=500)
+
+    def profile(self, text: str) -> DocumentProfile:
+        """
+        Compute structural features of a document.
+
+        Args:
+            text: Document text
+
+        Returns:
+            DocumentProfile for the text
+        """
+        line_count = sum(1 for line in text.splitlines() if line.strip())
+        label_hits = len(LABEL_PATTERN.findall(text))
+        polish_hits = len(POLISH_MARKERS.findall(text))
+
+        return DocumentProfile(
+            length=len(text),
+            line_count=line_count,
+            label_hits=label_hits,
+            label_density=label_hits / line_count if line_count else 0.0,
+            language="pl" if polish_hits >= 3 else "en"
+        )
+
+    def plan(self, profile: DocumentProfile, available: List[str],
+             latency_budget: Optional[float] = None) -> List[str]:
+        """
+        Order the available backends for a document.
+
+        Args:
+            profile: Profile of the document
+            available: Names of the configured backends
+            latency_budget: Maximum time in seconds the caller is willing to wait
+
+        Returns:
+            Backend names in the order they should be tried
+        """
+        candidates = sorted(available, key=lambda name: BACKEND_COSTS.get(name, len(BACKEND_COSTS)))
+
+        # The local model truncates long documents, so prefer a remote model for those
+        if profile.length > LOCAL_CONTEXT_CHARS and "local" in candidates and "openai" in candidates:
+            candidates.remove("local")
+            candidates.append("local")
+
+        # Unlabelled text rarely fills the schema via regexes; keep rules as a last resort
+        if profile.label_density < self.min_label_density and "rules" in candidates and len(candidates) > 1:
+            candidates.remove("rules")
+            candidates.append("rules")
+
+        # Backends that have been filling the schema poorly for this language go after the others
+        weak = [name for name in candidates
+                if self.coverage_estimates.get((name, profile.language), 1.0) < self.min_coverage]
+        if len(weak) < len(candidates):
+            candidates = [name for name in candidates if name not in weak] + weak
+
+        # Only measured latencies count against the budget; a backend that has never run gets one try
+        if latency_budget is not None:
+            within_budget = [name for name in candidates
+                             if self.latency_estimates.get(name, 0.0) <= latency_budget]
+            if within_budget:
+                candidates = within_budget
+            else:
+                candidates = [min(candidates, key=self.latency_estimates.get)]
+
+        return candidates
+
+    def route(self, text: str, backends: Dict[str, Callable],
+              latency_budget: Optional[float] = None) -> Tuple[Optional[BaseModel], RoutingDecision]:
+        """
+        Run backends on a document until one fills the schema well enough.
+
+        Args:
+            text: Document text
+            backends: Mapping of backend name to a callable taking text and returning a result or None
+            latency_budget: Maximum time in seconds the caller is willing to wait
+
+        Returns:
+            Tuple of the best result (or None) and the routing decision
+        """
+        start = time.perf_counter()
+        profile = self.profile(text)
+        decision = RoutingDecision(
+            timestamp=datetime.datetime.now().isoformat(),
+            profile=profile,
+            latency_budget=latency_budget,
+            plan=self.plan(profile, list(backends), latency_budget)
+        )
+
+        best = None
+        best_coverage = -1.0
+        for name in decision.plan:
+            spent = time.perf_counter() - start
+            if (latency_budget is not None and decision.attempts and
+                    spent + self.latency_estimates.get(name, 0.0) > latency_budget):
+                print(f"Skipping {name} backend: latency budget exhausted")
+                continue
+
+            attempt_start = time.perf_counter()
+            try:
+                result = backends[name](text)
+                error = None
+            except Exception as e:
+                print(f"Backend {name} failed: {str(e)}")
+                result = None
+                error = str(e)
+            elapsed = time.perf_counter() - attempt_start
+
+            coverage = field_coverage(result)
+            decision.attempts.append(BackendAttempt(
+                backend=name, elapsed=elapsed, coverage=coverage, error=error
+            ))
+            if error is None:
+                self.observe(name, elapsed, language=profile.language, coverage=coverage)
+
+            if result is not None and coverage > best_coverage:
+                best = result
+                best_coverage = coverage
+                decision.selected = name
+
+            if coverage >= self.min_coverage:
+                break
+
+        decision.elapsed = time.perf_counter() - start
+        self.record(decision)
+        return best, decision
+
+    def observe(self, backend: str, elapsed: float, language: Optional[str] = None,
+                coverage: Optional[float] = None):
+        """
+        Update the latency (and per-language coverage) estimates for a backend from an observed run.
+
+        Args:
+            backend: Backend name
+            elapsed: Observed time in seconds
+            language: Language of the document, if known
+            coverage: Field coverage of the result, if known
+        """
+        previous = self.latency_estimates.get(backend)
+        if previous is None:
+            self.latency_estimates[backend] = elapsed
+        else:
+            self.latency_estimates[backend] = 0.7 * previous + 0.3 * elapsed
+
+        if language is not None and coverage is not None:
+            key = (backend, language)
+            previous = self.coverage_estimates.get(key)
+            if previous is None:
+                self.coverage_estimates[key] = coverage
+            else:
+                self.coverage_estimates[key] = 0.7 * previous + 0.3 * coverage
+
+    def record(self, decision: RoutingDecision):
+        """
+        Store a routing decision in memory and append it to the routing log.
+
+        Args:
+            decision: Decision to record
+        """
+        self.decisions.append(decision)
+        if not self.log_path:
+            return
+
+        try:
+            log_dir = os.path.dirname(self.log_path)
+            if log_dir and not os.path.exists(log_dir):
+                os.makedirs(log_dir)
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(decision.model_dump()) + "\n")
+        except OSError as e:
+            print(f"Error writing routing log: {str(e)}")
@@ -0,0 +1,215 @@
+"""
+Speculative Extraction Module
+
+This module runs several extraction backends concurrently on one document and
+returns the first result that is complete enough, while the slower backends keep
+running in the background so their fuller results can be used for enrichment.
+"""
+
+import os
+import time
+import datetime
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional
+from pydantic import BaseModel
+
+from .profiling import current_profiler
+from .router import BackendAttempt, RoutingDecision, field_coverage
+
+# Shared worker pool so per-request extractors do not each spawn their own threads
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the shared worker pool, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("SPECULATIVE_WORKERS", "8")),
+                thread_name_prefix="crm-speculative"
+            )
+        return _executor
+
+
+class SpeculativeRace:
+    """Concurrent run of several backends on one document."""
+
+    def __init__(self, router, text: str, backends: Dict[str, Callable],
+                 min_coverage: Optional[float] = None):
+        """
+        Start all backends on the document.
+
+        Args:
+            router: BackendRouter used for profiling, latency tracking and the decision log
+            text: Document text
+            backends: Mapping of backend name to a callable taking text and returning a result or None
+            min_coverage: Field coverage a result needs to win the race (defaults to the router's)
+        """
+        self.router = router
+        self.min_coverage = router.min_coverage if min_coverage is None else min_coverage
+        self.results = {}
+        self.winner = None
+
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._recorded = False
+        self._decision = RoutingDecision(
+            timestamp=datetime.datetime.now().isoformat(),
+            profile=router.profile(text),
+            plan=list(backends)
+        )
+
+        executor = get_executor()
+        self._futures = {}
+        for name, backend in backends.items():
+            # Each backend runs in a copy of the caller's context so an active profiler follows it
+            future = executor.submit(contextvars.copy_context().run, self._run, name, backend, text)
+            self._futures[future] = name
+
+        # Registered after submission so a fast backend cannot finish the race early
+        for future in list(self._futures):
+            future.add_done_callback(self._on_done)
+
+    def first(self, timeout: Optional[float] = None) -> Optional[BaseModel]:
+        """
+        Wait for the first result that meets the completeness threshold.
+
+        Backends that have not started yet are cancelled once a winner is found.
+        If no result meets the threshold before the timeout, the most complete
+        finished result is returned instead, or None if no backend has finished
+        with a result (backends still running keep going for `full()`).
+
+        Args:
+            timeout: Maximum time in seconds to wait (None for no limit)
+
+        Returns:
+            The winning result, or None if every backend failed or found nothing
+            in time
+        """
+        self._decision.latency_budget = timeout
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        pending = set(self._futures)
+
+        while pending:
+            remaining = None if deadline is None else max(deadline - time.perf_counter(), 0)
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                result, coverage = future.result()
+                if result is not None and coverage >= self.min_coverage:
+                    self._set_winner(self._futures[future])
+                    for other in pending:
+                        other.cancel()
+                    return result
+
+            if deadline is not None and time.perf_counter() >= deadline:
+                # Out of time: settle for the best finished result, if any
+                break
+
+        name = self._best()
+        if name is not None:
+            self._set_winner(name)
+            return self.results[name][0]
+        return None
+
+    def full(self, timeout: Optional[float] = None) -> Optional[BaseModel]:
+        """
+        Wait for all backends that were not cancelled and return the most complete result.
+
+        Args:
+            timeout: Maximum time in seconds to wait (None for no limit)
+
+        Returns:
+            The most complete result, or None if every backend failed or found nothing
+        """
+        wait([f for f in self._futures if not f.cancelled()], timeout=timeout)
+        name = self._best()
+        return self.results[name][0] if name is not None else None
+
+    def add_done_callback(self, callback: Callable):
+        """
+        Call a function with the most complete result once every backend has finished.
+
+        Args:
+            callback: Function taking the result (or None)
+        """
+        with self._lock:
+            if not self.done():
+                self._callbacks.append(callback)
+                return
+        callback(self.full())
+
+    def done(self) -> bool:
+        """Return True when every backend has finished or was cancelled."""
+        return all(future.done() for future in self._futures)
+
+    @property
+    def attempts(self) -> List[BackendAttempt]:
+        """Attempts that have finished so far."""
+        return list(self._decision.attempts)
+
+    def _run(self, name: str, backend: Callable, text: str):
+        """Run one backend and record the attempt."""
+        profiler = current_profiler()
+        if profiler is not None:
+            profiler.attach_thread()
+
+        start = time.perf_counter()
+        try:
+            result = backend(text)
+            error = None
+        except Exception as e:
+            print(f"Backend {name} failed: {str(e)}")
+            result = None
+            error = str(e)
+        elapsed = time.perf_counter() - start
+
+        coverage = field_coverage(result)
+        with self._lock:
+            self._decision.attempts.append(BackendAttempt(
+                backend=name, elapsed=elapsed, coverage=coverage, error=error
+            ))
+            if result is not None:
+                self.results[name] = (result, coverage)
+        if error is None:
+            self.router.observe(name, elapsed, language=self._decision.profile.language, coverage=coverage)
+
+        return result, coverage
+
+    def _on_done(self, future):
+        """Record the decision and notify callbacks once the last backend finishes."""
+        with self._lock:
+            if not self.done() or self._recorded:
+                return
+            self._recorded = True
+            self._decision.elapsed = time.perf_counter() - self._start
+            callbacks, self._callbacks = self._callbacks, []
+
+        self.router.record(self._decision)
+        if callbacks:
+            name = self._best()
+            full_result = self.results[name][0] if name is not None else None
+            for callback in callbacks:
+                try:
+                    callback(full_result)
+                except Exception as e:
+                    print(f"Error in enrichment callback: {str(e)}")
+
+    def _set_winner(self, name: str):
+        """Remember which backend won the race."""
+        with self._lock:
+            if self.winner is None:
+                self.winner = name
+                self._decision.selected = name
+
+    def _best(self) -> Optional[str]:
+        """Return the name of the backend with the most complete result."""
+        with self._lock:
+            if not self.results:
+                return None
+            return max(self.results, key=lambda name: self.results[name][1])